@@ -9,14 +9,11 @@ https://github.com/Axel-Erfurt
 """
 import gi
 gi.require_versions({'Gtk': '3.0', 'Gdk': '3.0', 'Gst': '1.0'})
-import configparser
-from gi.repository import Gtk, Gdk, GdkPixbuf, Gst
-import requests
-
-CONFIG = configparser.ConfigParser()
-CONFIG.read('config')
-
-
+from gi.repository import Gtk, Gdk, GdkPixbuf
+from radiocore import startup
+from radiocore.favorites import FavoritesStore, IniFavorites
+from radiocore.icons import load_theme_icon
+from radiocore.player import Player
 
 class Window(Gtk.ApplicationWindow):
     def __init__(self):
@@ -28,7 +25,6 @@ class Window(Gtk.ApplicationWindow):
         self.set_title('Radio Player')
         self.set_icon_name('applications-multimedia')
         self.connect("destroy",Gtk.main_quit)
-        self.old_tag = ""
 
         self.header = Gtk.HeaderBar()
         self.header.set_title('Radio Player')
@@ -59,7 +55,6 @@ class Window(Gtk.ApplicationWindow):
         
         self.search_entry = Gtk.SearchEntry(placeholder_text = "find ...")
         self.search_entry.connect("changed", self.visible_cb)
-        self.search_entry.connect("icon-press", self.read_channels)
         
 
         self.header.add(self.stop_button)        
@@ -68,9 +63,12 @@ class Window(Gtk.ApplicationWindow):
 
         self.model = Gtk.ListStore(object)
         self.model.set_column_types((str, str, GdkPixbuf.Pixbuf))
+        self.search_text = ""
+        self.filter = self.model.filter_new()
+        self.filter.set_visible_func(self.filter_func)
 
         self.icon_view = Gtk.IconView()
-        self.icon_view.set_model(model=self.model)
+        self.icon_view.set_model(model=self.filter)
         self.icon_view.set_item_width(-1)
         self.icon_view.set_text_column(0)
         self.icon_view.set_pixbuf_column(2)
@@ -99,135 +97,74 @@ class Window(Gtk.ApplicationWindow):
         self.tag_label.set_halign(Gtk.Align.CENTER)
         vbox.pack_end(self.tag_label, False, True, 0)
 
-        Gst.init('')
-        self.playbin = Gst.ElementFactory.make('playbin', 'player')
-        
-        ### Listen for metadata
-        self.old_tag = None
-        self.bus = self.playbin.get_bus()
-        self.bus.enable_sync_message_emission()
-        self.bus.add_signal_watch()
-        self.bus.connect('message::tag', self.on_tag)
-        self.read_channels()
+        self.player = Player()
+        self.player.connect("title-changed", self.on_title)
+        self.player.connect("status", self.on_status)
+        self.player.connect("state-changed", self.on_state)
+        self.favorites = FavoritesStore(IniFavorites('config'))
+        startup.after_first_frame(self.read_channels)
 
     def read_channels(self, *args):
         self.model.clear()
-        for section in CONFIG.sections():
-            icon = Gtk.IconTheme.get_default().load_icon(
-                    'audio-volume-high', 16, Gtk.IconLookupFlags.USE_BUILTIN)
-            self.model.append((section, CONFIG[section]['url'], icon))
+        icon = load_theme_icon('audio-volume-high')
+        for url, name in self.favorites.items():
+            self.model.append((name, url, icon))
+            
+    def filter_func(self, model, iter, data):
+        return self.search_text in model[iter][0].lower()
             
     def refresh_filter(self,widget):
         self.filter.refilter()
         
     def visible_cb(self, entry, *args):
-        search_query = entry.get_text().lower()
-        if search_query == "":
-            self.read_channels()
-        for row in self.model:
-            if not search_query in row[0].lower():
-                path = row.path
-                iter = self.model.get_iter(path)
-                self.model.remove(iter)
+        ### the rows stay in the model, the filter only hides them
+        self.search_text = entry.get_text().lower()
+        self.refresh_filter(entry)
 
             
     def set_volume(self, *args):
         vol = self.vol_slider.get_value()
         self.volume_label.set_text(f"Volume: {vol * 100:.0f}")
-        self.playbin.set_property("volume", vol)
+        self.player.set_volume(vol)
         
     def set_mute_status(self, *args):
         vol = self.vol_slider.get_value()
-        if self.playbin.get_property("mute") == True:
-            self.playbin.set_property("mute", False)
+        if self.player.get_mute():
+            self.player.set_mute(False)
             self.mute_button.set_image(Gtk.Image.new_from_icon_name(
                     'audio-volume-high', 2))
             self.volume_label.set_text(f"Volume: {vol * 100:.0f}")
         else:
-            self.playbin.set_property("mute", True)
+            self.player.set_mute(True)
             self.mute_button.set_image(Gtk.Image.new_from_icon_name(
                     'audio-volume-muted', 2))
             self.volume_label.set_text(f"Volume: {vol * 100:.0f} muted")
 
     def play(self, view, path):
         print(view.get_selected_items()[0])
-        url = self.model[path][1]
-        if url.endswith(".pls"):
-            url = self.getURLfromPLS(url)
-        if url.endswith(".m3u"):
-            url = self.getURLfromM3U(url)        
-        print(url)
-        self.playbin.set_state(Gst.State.NULL)
-        self.playbin.set_property('uri', url)
-        self.playbin.set_state(Gst.State.PLAYING)
-        self.playbin.set_property("mute", False)
-        self.header.set_subtitle(self.model[path][0])
-        self.stop_button.set_sensitive(True)
+        self.player.play(self.filter[path][0], self.filter[path][1])
+        self.header.set_subtitle(self.filter[path][0])
 
     def stop(self, button):
-        self.playbin.set_state(Gst.State.NULL)
+        self.player.stop()
         self.header.set_subtitle(None)
-        self.stop_button.set_sensitive(False)
         
-    def on_tag(self, bus, msg):
-        if msg:
-            taglist = msg.parse_tag()
-            if taglist:
-                if not taglist.get_string(taglist.nth_tag_name(0)).value == None:
-                    my_tag = f'{taglist.get_string(taglist.nth_tag_name(0)).value}'
-                    if my_tag:
-                        if not self.old_tag == my_tag and not my_tag == "None":
-                            print(my_tag)
-                            self.tag_label.set_text(my_tag)
-                            self.old_tag = my_tag
-
-    def getURLfromPLS(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("pls detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        print(response.text)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
-        else:
-           print("no urls found") 
-    
-    def getURLfromM3U(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("m3u detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        print(response.text)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
-        else:
-           print("no urls found") 
+    def on_state(self, player, playing):
+        self.stop_button.set_sensitive(playing)
         
+    def on_status(self, player, text):
+        self.tag_label.set_text(text or player.title or "")
+        
+    def on_title(self, player, title):
+        if title and not player.buffering:
+            self.tag_label.set_text(title)
+
 if __name__ == '__main__':
     window = Window()
     window.set_volume()
     window.resize(720, 320)
     window.move(0, 0)
+    startup.report_first_frame(window, Gtk.main_quit)
     window.show_all()
     Gtk.main()
     
@@ -9,18 +9,32 @@ https://github.com/Axel-Erfurt
 """
 import gi
 gi.require_versions({'Gtk': '4.0', 'Gdk': '4.0', 'Gst': '1.0', 'Adw': '1'})
-import configparser
-from gi.repository import Gtk, Gdk, GdkPixbuf, Gst, Gio, Adw
-import requests
+from gi.repository import Gtk, Gdk, Gio, Adw, GObject, GLib
+from radiocore import control, startup
+from radiocore.favorites import FavoritesStore, IniFavorites
+from radiocore.icons import load_icon
+from radiocore.player import Player
 import sys
 import warnings
 
 warnings.filterwarnings("ignore")
 
-CONFIG = configparser.ConfigParser(strict=False)
-CONFIG.read('config')
+class Station(GObject.Object):
+    __gtype_name__ = 'Station'
 
+    def __init__(self, name, url, icon=None):
+        super().__init__()
+        self._name = name
+        self._url = url
+        self.icon = icon
 
+    @GObject.Property
+    def name(self):
+        return self._name
+
+    @GObject.Property
+    def url(self):
+        return self._url
 
 class RadioWindow(Gtk.ApplicationWindow):
     def __init__(self, *args, **kwargs):
@@ -28,7 +42,6 @@ class RadioWindow(Gtk.ApplicationWindow):
         
         self.set_title('Radio Player')
         self.set_icon_name('applications-multimedia')
-        self.old_tag = ""
         
         self.connect("close-request", self.handle_close)
         
@@ -39,7 +52,7 @@ class RadioWindow(Gtk.ApplicationWindow):
         self.set_titlebar(self.header)
         
         self.remove_button = Gtk.Button.new_from_icon_name('edit-delete')
-        self.remove_button.set_tooltip_text("remove channel\nwill be saved on exit")
+        self.remove_button.set_tooltip_text("remove channel from Favorites")
         self.remove_button.connect("clicked", self.delete_channel)
         
         self.header.pack_start(self.remove_button)
@@ -69,16 +82,21 @@ class RadioWindow(Gtk.ApplicationWindow):
         self.header.pack_start(self.mute_button)
         self.header.pack_end(self.search_entry)
 
-        self.model = Gtk.ListStore(object)
-        self.model.set_column_types((str, str, GdkPixbuf.Pixbuf))
+        self.model = Gio.ListStore(item_type=Station)
+        self.filter_model = Gtk.FilterListModel(model=self.model)
+        self.filter = Gtk.CustomFilter.new(self._do_filter_view, self.filter_model)
+        self.filter_model.set_filter(self.filter)
+        self.selection = Gtk.SingleSelection(model=self.filter_model, autoselect=False, can_unselect=True)
+        self.selection.connect("notify::selected-item", self.selection_changed)
+        self.search_text = ''
+        self.playing = None
+        
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self._on_factory_setup)
+        factory.connect("bind", self._on_factory_bind)
 
-        self.icon_view = Gtk.IconView()
-        self.icon_view.set_model(model=self.model)
-        self.icon_view.set_item_width(-1)
-        self.icon_view.set_text_column(0)
-        self.icon_view.set_pixbuf_column(2)
-        self.icon_view.set_activate_on_single_click(True)
-        self.icon_view.connect('item-activated', self.play)
+        self.icon_view = Gtk.GridView(model=self.selection, factory=factory)
+        self.icon_view.connect('activate', self.play)
         self.icon_view.set_vexpand(True)
 
         scroll = Gtk.ScrolledWindow()
@@ -106,142 +124,172 @@ class RadioWindow(Gtk.ApplicationWindow):
         self.tag_label.set_halign(Gtk.Align.CENTER)
         vbox.append(self.tag_label)
 
-        Gst.init('')
-        self.playbin = Gst.ElementFactory.make('playbin', 'player')
+        self.player = Player()
+        self.player.connect("title-changed", self.on_title)
+        self.player.connect("status", self.on_status)
+        self.player.connect("state-changed", self.on_state)
+        self.favorites = FavoritesStore(IniFavorites('config'))
+        self.control = control.ControlServer({
+            "play": self.control_play,
+            "stop": lambda: self.stop(None),
+            "volume": lambda value=None: control.volume(self.vol_slider.get_value, self.vol_slider.set_value, value),
+            "mute": lambda state=None: control.mute(self.player, self.set_mute_status, state),
+            "status": lambda: control.player_status(self.player),
+            "favorites": lambda: [(name, url) for url, name in self.favorites.items()],
+            "add-favorite": self.add_channel,
+            "remove-favorite": self.control_remove,
+        }, control.socket_path("radioplayer"))
+        control.publish_player(self.control, self.player)
+        try:
+            self.control.start()
+        except OSError as e:
+            print("no control socket:", e)
+        startup.after_first_frame(self.read_channels)
+        
+    def _on_factory_setup(self, factory, list_item):
+        box = Gtk.Box(spacing=2, orientation=Gtk.Orientation.VERTICAL, width_request=90)
+        image = Gtk.Image()
+        box.append(image)
+        label = Gtk.Label(wrap=True, max_width_chars=12, justify=Gtk.Justification.CENTER)
+        box.append(label)
+        list_item.set_child(box)
         
-        ### Listen for metadata
-        self.old_tag = None
-        self.bus = self.playbin.get_bus()
-        self.bus.enable_sync_message_emission()
-        self.bus.add_signal_watch()
-        self.bus.connect('message::tag', self.on_tag)
-        self.read_channels()
+    def _on_factory_bind(self, factory, list_item):
+        box = list_item.get_child()
+        image = box.get_first_child()
+        label = image.get_next_sibling()
+        station = list_item.get_item()
+        image.set_from_pixbuf(station.icon)
+        label.set_text(station.name)
+        
+    def _do_filter_view(self, item, filter_list_model):
+        return self.search_text in item.name.lower()
         
     def handle_close(self, *args):
-        channels = ""
-        item = self.model.get_iter_first ()
-
-        while ( item != None ):
-            channels += (f"[{self.model.get_value (item, 0)}]\nurl={self.model.get_value (item, 1)}\n")
-            item = self.model.iter_next(item)
+        self.favorites.close()
+        self.control.close()
+            
+    def delete_channel(self, *args):
+        station = self.selection.get_selected_item()
+        if station is None:
+            return
+        position = self.selection.get_selected()
+        found, index = self.model.find(station)
+        if found:
+            self.model.remove(index)
+        print(f"{station.name} removed")
+        self.favorites.remove(station.url)
+        if position < self.filter_model.get_n_items():
+            self.selection.set_selected(position)
 
-        with open("config", "w") as f:
-            f.write(channels)
+    def stations(self):
+        return [self.model.get_item(i) for i in range(self.model.get_n_items())]
+        
+    ### the control socket counts stations from 1, as they are shown
+    def find_station(self, what):
+        what = str(what)
+        stations = self.stations()
+        if "://" in what:
+            for station in stations:
+                if station.url == what:
+                    return station
+            raise LookupError(f"{what} is not in Favorites")
+        return control.pick(stations, what, "favorite")
+        
+    def control_play(self, what):
+        what = str(what)
+        if "://" in what and not what in self.favorites:
+            station = Station(what, what)
+        else:
+            station = self.find_station(what)
+        self.selection.unselect_all()
+        self.playing = station
+        self.player.play(station.name, station.url)
+        self.set_title(station.name)
+        return station.name
+        
+    def add_channel(self, name, url):
+        if not self.favorites.add(name, url):
+            raise ValueError(f"{url} is already in Favorites")
+        self.model.append(Station(name, url, load_icon("icon.png")))
+        return len(self.favorites)
+        
+    def control_remove(self, what):
+        station = self.find_station(what)
+        found, index = self.model.find(station)
+        if found:
+            self.model.remove(index)
+        self.favorites.remove(station.url)
+        return len(self.favorites)
         
-    def delete_channel(self, path, *args):
-        iter = self.model.get_iter(self.icon_view.get_selected_items()[0])
-        path = self.icon_view.get_selected_items()[0]
-        name = self.model.get_value (iter, 0)
-        self.model.remove(iter)
-        print(f"{name} removed")
-        self.icon_view.select_path(path)
-        self.icon_view.emit("item-activated", path)
-
     def read_channels(self):
-        self.model.clear()
-        for section in CONFIG.sections():
-            icon_image_name = Gtk.Image.new_from_icon_name('audio-volume-high')
-            icon_image = GdkPixbuf.Pixbuf.new_from_file("icon.png").scale_simple(20, 20, GdkPixbuf.InterpType.NEAREST)
-            self.model.append((section, CONFIG[section]['url'], icon_image))
+        icon_image = load_icon("icon.png")
+        stations = [Station(name, url, icon_image) for url, name in self.favorites.items()]
+        self.model.splice(0, self.model.get_n_items(), stations)
         
     def visible_cb(self, entry, *args):
+        ### only refilter, longer queries just check the rows still shown
         search_query = entry.get_text().lower()
-        if search_query == "":
-            self.read_channels()
-        for row in self.model:
-            if not search_query in row[0].lower():
-                path = row.path
-                iter = self.model.get_iter(path)
-                self.model.remove(iter)
+        if search_query == self.search_text:
+            return
+        if search_query.startswith(self.search_text):
+            change = Gtk.FilterChange.MORE_STRICT
+        elif self.search_text.startswith(search_query):
+            change = Gtk.FilterChange.LESS_STRICT
+        else:
+            change = Gtk.FilterChange.DIFFERENT
+        self.search_text = search_query
+        self.filter.changed(change)
             
     def set_volume(self, *args):
         vol = self.vol_slider.get_value()
         self.volume_label.set_text(f"Volume: {vol * 100:.0f}")
-        self.playbin.set_property("volume", vol)
+        self.player.set_volume(vol)
         
     def set_mute_status(self, *args):
         vol = self.vol_slider.get_value()
-        if self.playbin.get_property("mute") == True:
-            self.playbin.set_property("mute", False)
+        if self.player.get_mute():
+            self.player.set_mute(False)
             self.mute_button.set_icon_name('audio-volume-high')
             self.volume_label.set_text(f"Volume: {vol * 100:.0f}")
         else:
-            self.playbin.set_property("mute", True)
+            self.player.set_mute(True)
             self.mute_button.set_icon_name('audio-volume-muted')
             self.volume_label.set_text(f"Volume: {vol * 100:.0f} muted")
 
-    def play(self, view, path):
-        url = self.model[path][1]
-        if url.endswith(".pls"):
-            url = self.getURLfromPLS(url)
-        if url.endswith(".m3u"):
-            url = self.getURLfromM3U(url)        
-        print(url)
-        self.playbin.set_state(Gst.State.NULL)
-        self.playbin.set_property('uri', url)
-        self.playbin.set_state(Gst.State.PLAYING)
-        self.playbin.set_property("mute", False)
-        self.set_title(self.model[path][0])
-        self.stop_button.set_sensitive(True)
+    def selection_changed(self, selection, *args):
+        ### a click selects and plays, refiltering keeps the selection and the stream
+        if selection.get_selected_item() is not self.playing:
+            self.play()
+
+    def play(self, *args):
+        station = self.selection.get_selected_item()
+        if station is None:
+            return
+        self.playing = station
+        self.player.play(station.name, station.url)
+        self.set_title(station.name)
 
     def stop(self, button):
-        self.playbin.set_state(Gst.State.NULL)
-        self.stop_button.set_sensitive(False)
+        self.player.stop()
+        ### the same station clicked next time plays again
+        self.playing = None
+        self.selection.unselect_all()
         
-    def on_tag(self, bus, msg):
-        if msg:
-            taglist = msg.parse_tag()
-            if taglist:
-                if not taglist.get_string(taglist.nth_tag_name(0)).value == None:
-                    my_tag = f'{taglist.get_string(taglist.nth_tag_name(0)).value}'
-                    if my_tag:
-                        if not self.old_tag == my_tag and not my_tag == "None":
-                            print(my_tag)
-                            self.tag_label.set_markup(f'<b><span foreground="#55aaff" size="x-large">{my_tag}</span></b>')
-                            self.old_tag = my_tag
-
-    def getURLfromPLS(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("pls detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        print(response.text)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
-        else:
-           print("no urls found") 
-    
-    def getURLfromM3U(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("m3u detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        print(response.text)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
+    def on_state(self, player, playing):
+        self.stop_button.set_sensitive(playing)
+        
+    def on_status(self, player, text):
+        if text:
+            self.tag_label.set_text(text)
         else:
-           print("no urls found") 
+            self.on_title(player, player.title)
+        
+    def on_title(self, player, title):
+        if title and not player.buffering:
+            self.tag_label.set_markup(f'<b><span foreground="#55aaff" size="x-large">{GLib.markup_escape_text(title)}</span></b>')
            
+
 class MyApp(Adw.Application):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -252,6 +300,7 @@ class MyApp(Adw.Application):
         
     def on_activate(self, app, *args, **kwargs):
         self.win = RadioWindow(application=app)
+        startup.report_first_frame(self.win, self.quit)
         self.win.present()
         keycont = Gtk.EventControllerKey()
         
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Radio Daemon
+============
+the player without a window, controlled over a local socket
+
+RadioDaemon.py --daemon          run the player in the foreground
+RadioDaemon.py search TERM [CC]  search radio-browser.info, CC is a country code
+RadioDaemon.py play N            play favorite N
+RadioDaemon.py play-result N     play result N of the last search
+RadioDaemon.py play URL          play a stream url
+RadioDaemon.py stop
+RadioDaemon.py volume [0-100]
+RadioDaemon.py mute [on|off]
+RadioDaemon.py status
+RadioDaemon.py results           the last search again
+RadioDaemon.py favorites
+RadioDaemon.py add-favorite NAME URL
+RadioDaemon.py remove-favorite N|URL
+RadioDaemon.py watch             print titles and state changes as they happen
+RadioDaemon.py quit
+
+commands joined by + are sent at once: RadioDaemon.py play 2 + volume 30
+--app radiofinder or --app radioplayer controls the open window instead,
+otherwise any command starts the daemon if it is not running yet
+"""
+### the client only talks to the socket, GStreamer and the player are loaded by the daemon alone
+import os
+import sys
+import subprocess
+import time
+from radiocore import control
+
+SEARCH_LIMIT = 100 # stations per search
+DAEMON_START_TIMEOUT = 5 # seconds to wait for a daemon started by the client
+
+class RadioDaemon:
+    def __init__(self):
+        from gi.repository import GLib
+        from concurrent.futures import ThreadPoolExecutor
+        from radiocore.player import Player
+        from radiocore.favorites import FavoritesStore
+        self.loop = GLib.MainLoop()
+        self.player = Player()
+        self.player.connect("title-changed", lambda player, title: print(title))
+        self.player.connect("status", lambda player, text: text and print(text))
+        ### shared with RadioFinderApp4D.py, play N counts the list the window shows
+        self.favorites = FavoritesStore()
+        self.results = []
+        self.search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.server = control.ControlServer({
+            "search": self.search,
+            "results": lambda: self.results,
+            "play": self.play,
+            "play-result": self.play_result,
+            "stop": self.stop,
+            "volume": lambda value=None: control.volume(lambda: self.player.volume, self.player.set_volume, value),
+            "mute": lambda state=None: control.mute(self.player, lambda: self.player.set_mute(not self.player.get_mute()), state),
+            "status": lambda: control.player_status(self.player),
+            "favorites": self.list_favorites,
+            "add-favorite": self.add_favorite,
+            "remove-favorite": self.remove_favorite,
+            "quit": self.quit,
+        })
+        control.publish_player(self.server, self.player)
+
+    def run(self):
+        from gi.repository import GLib
+        import signal
+        self.server.start()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, self.quit)
+        print(f"listening on {self.server.path}")
+        try:
+            self.loop.run()
+        finally:
+            self.player.stop()
+            self.server.close()
+            self.favorites.close()
+
+    def search(self, term, country=""):
+        params = {'name': term, 'nameExact': 'false', 'limit': str(SEARCH_LIMIT)}
+        if country:
+            params['countrycode'] = country
+        return self.search_pool.submit(self.find, params)
+
+    def find(self, params):
+        ### requests and the search stack are loaded with the first search
+        from radiocore.browser import RadioBrowser
+        stations = RadioBrowser().station_search(params=params)
+        self.results = [(station["name"].strip(), station["url"]) for station in stations if station.get("url")]
+        return self.results
+
+    def play(self, what):
+        what = str(what)
+        if "://" in what:
+            name, url = what, what
+        else:
+            url, name = control.pick(self.favorites.items(), what, "favorite")
+        self.player.play(name, url)
+        return name
+
+    def play_result(self, number):
+        name, url = control.pick(self.results, number, "search result")
+        self.player.play(name, url)
+        return name
+
+    def stop(self):
+        self.player.stop()
+
+    def list_favorites(self):
+        return [(name, url) for url, name in self.favorites.items()]
+
+    def add_favorite(self, name, url):
+        if not self.favorites.add(name, url):
+            raise ValueError(f"{url} is already in Favorites")
+        return len(self.favorites)
+
+    def remove_favorite(self, what):
+        what = str(what)
+        url = what if "://" in what else control.pick(self.favorites.items(), what, "favorite")[0]
+        if not self.favorites.remove(url):
+            raise LookupError(f"{url} is not in Favorites")
+        return len(self.favorites)
+
+    def quit(self):
+        self.loop.quit()
+        return False
+
+def start_daemon():
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--daemon"],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if control.is_running():
+            return True
+        time.sleep(0.05)
+    return False
+
+def show(cmd, result):
+    if cmd in ("search", "results", "favorites"):
+        for number, (name, url) in enumerate(result, 1):
+            print(f"{number:4}  {name}")
+        if not result:
+            print("no favorites" if cmd == "favorites" else "nothing found")
+    elif cmd == "status":
+        for key, value in result.items():
+            print(f"{key:8} {'' if value is None else value}")
+    elif result is not None and result is not False:
+        print(result)
+
+def watch(path):
+    for event, data in control.listen(path):
+        if event == "title":
+            print(f"{data['station']}: {data['title']}")
+        elif event == "state":
+            print(f"playing {data['station']}" if data["station"] else "stopped")
+        elif data:
+            print(data)
+
+def split_commands(args):
+    commands = [[]]
+    for arg in args:
+        if arg == "+":
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+    return [command for command in commands if command]
+
+def main(args):
+    app = None
+    if args[:1] == ["--app"] and len(args) > 1:
+        app, args = args[1], args[2:]
+    if not args or args[0] in ("-h", "--help"):
+        print(__doc__.strip())
+        return 0
+    if args[0] == "--daemon":
+        RadioDaemon().run()
+        return 0
+    path = control.socket_path(app) if app else control.socket_path()
+    commands = split_commands(args)
+    try:
+        try:
+            if args[0] == "watch":
+                watch(path)
+                return 0
+            responses = control.call_batch(commands, path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if app is not None:
+                print(f"{app} is not running")
+                return 1
+            if args == ["quit"]:
+                return 0
+            if not start_daemon():
+                print("the daemon did not start, run RadioDaemon.py --daemon to see why")
+                return 1
+            if args[0] == "watch":
+                watch(path)
+                return 0
+            responses = control.call_batch(commands, path)
+    except KeyboardInterrupt:
+        return 0
+    except OSError as e:
+        print("no answer:", e)
+        return 1
+    failed = 0
+    for command, response in zip(commands, responses):
+        if response["ok"]:
+            show(command[0], response["result"])
+        else:
+            print(response["error"])
+            failed = 1
+    return failed
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
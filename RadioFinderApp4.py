@@ -3,96 +3,21 @@
 
 import gi
 gi.require_versions({'Gtk': '4.0', 'Gst': '1.0', 'Adw': '1'})
-from gi.repository import Gtk, GdkPixbuf, Gst, Gio, Adw
-import requests
+from gi.repository import Gtk, GdkPixbuf, Gio, Adw, GLib
 import sys
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+import radiocore
+from radiocore import startup
+from radiocore.favorites import FavoritesStore, IniFavorites
+from radiocore.icons import load_icon
+from radiocore.player import Player
+from radiocore.search import SearchRunner
 
 warnings.filterwarnings("ignore")
 
-BASE_URL =  "https://de1.api.radio-browser.info/"
-
-endpoints = {
-    "countries": {1: "{fmt}/countries", 2: "{fmt}/countries/{filter}"},
-    "codecs": {1: "{fmt}/codecs", 2: "{fmt}/codecs/{filter}"},
-    "states": {
-        1: "{fmt}/states",
-        2: "{fmt}/states/{filter}",
-        3: "{fmt}/states/{country}/{filter}",
-    },
-    "languages": {1: "{fmt}/languages", 2: "{fmt}/languages/{filter}"},
-    "tags": {1: "{fmt}/tags", 2: "{fmt}/tags/{filter}"},
-    "stations": {1: "{fmt}/stations", 3: "{fmt}/stations/{by}/{search_term}"},
-    "playable_station": {3: "{ver}/{fmt}/url/{station_id}"},
-    "station_search": {1: "{fmt}/stations/search"},
-}
-
-def request(endpoint, **kwargs):
-
-    fmt = kwargs.get("format", "json")
-
-    if fmt == "xml":
-        content_type = f"application/{fmt}"
-    else:
-        content_type = f"application/{fmt}"
-
-    headers = {"content-type": content_type, "User-Agent": "getRadiolist/1.0"}
-
-    params = kwargs.get("params", {})
-
-    url = BASE_URL + endpoint
-
-    resp = requests.get(url, headers=headers, params=params)
-
-    if resp.status_code == 200:
-        if fmt == "xml":
-            return resp.text
-        return resp.json()
-
-    return resp.raise_for_status()
-
-
-class EndPointBuilder:
-    def __init__(self, fmt="json"):
-        self.fmt = fmt
-        self._option = None
-        self._endpoint = None
-
-    @property
-    def endpoint(self):
-        return endpoints[self._endpoint][self._option]
-
-    def produce_endpoint(self, **parts):
-        self._option = len(parts)
-        self._endpoint = parts["endpoint"]
-        parts.update({"fmt": self.fmt})
-        return self.endpoint.format(**parts)
-
-
-class RadioBrowser:
-    def __init__(self, fmt="json"):
-        self.fmt = fmt
-        self.builder = EndPointBuilder(fmt=self.fmt)
-
-    def stations(self, **params):
-        endpoint = self.builder.produce_endpoint(endpoint="stations")
-        kwargs = {}
-        if params:
-            kwargs.update({"params": params})
-        return request(endpoint, **kwargs)
-
-    def stations_byname(self, name):
-        endpoint = self.builder.produce_endpoint(
-            endpoint="stations", by="byname", search_term=name
-        )
-        return request(endpoint)
-
-    def station_search(self, params, **kwargs):
-        assert isinstance(params, dict), "params must be a dictionary."
-        kwargs["params"] = params
-        endpoint = self.builder.produce_endpoint(endpoint="station_search")
-        return request(endpoint, **kwargs)
-
+### station searches run here, results go back to the main loop via GLib.idle_add
+SEARCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search")
 
 class FinderWindow(Gtk.ApplicationWindow):
     def __init__(self, *args, **kwargs):
@@ -102,7 +27,6 @@ class FinderWindow(Gtk.ApplicationWindow):
         
         self.playlist = ""
         self.set_icon_name('applications-multimedia')
-        self.old_tag = ""
 
         self.header = Gtk.HeaderBar()
         self.header.set_show_title_buttons(True)
@@ -127,6 +51,9 @@ class FinderWindow(Gtk.ApplicationWindow):
         
         self.search_entry = Gtk.SearchEntry(placeholder_text = "find ...", tooltip_text = "find ...")
         self.search_entry.connect("activate", self.find_stations)
+        self.search_entry.connect("search-changed", self.on_search_changed)
+        
+        self.search = SearchRunner(SEARCH_POOL)
 
         self.header.pack_start(self.stop_button)        
         self.header.pack_start(self.mute_button)
@@ -196,15 +123,15 @@ class FinderWindow(Gtk.ApplicationWindow):
         vbox.append(self.tag_label)
         vbox.append(self.status_bar)
 
-        Gst.init('')
-        self.playbin = Gst.ElementFactory.make('playbin', 'player')
+        self.player = Player()
+        self.player.connect("title-changed", self.on_title)
+        self.player.connect("status", self.on_status)
+        self.player.connect("state-changed", self.on_state)
+        self.favorites = FavoritesStore(IniFavorites('config'))
+        self.connect("close-request", self.handle_close)
         
-        ### Listen for metadata
-        self.old_tag = None
-        self.bus = self.playbin.get_bus()
-        self.bus.enable_sync_message_emission()
-        self.bus.add_signal_watch()
-        self.bus.connect('message::tag', self.on_tag)
+    def handle_close(self, *args):
+        self.favorites.close()
         
     def transfer_channel(self, *args):
         selected_path = self.icon_view.get_selected_items()[0]
@@ -212,65 +139,53 @@ class FinderWindow(Gtk.ApplicationWindow):
 
         name = self.icon_view.get_model().get_value(selected_iter, 0)
         url = self.icon_view.get_model().get_value(selected_iter, 1)
-        channel = f"[{name}]\nurl={url}"
-        print(channel)
-        with open("config", 'a') as f:
-            f.write(f"\n{channel}")
+        if self.favorites.add(name, url):
+            print(f"{name} added")
+        else:
+            self.tag_label.set_text(f"{name} is already in Favorites")
             
             
     def set_volume(self, *args):
         vol = self.vol_slider.get_value()
         self.volume_label.set_text(f"Volume: {vol * 100:.0f}")
-        self.playbin.set_property("volume", vol)
+        self.player.set_volume(vol)
         
     def set_mute_status(self, *args):
-        if self.playbin.get_property("mute") == True:
-            self.playbin.set_property("mute", False)
+        if self.player.get_mute():
+            self.player.set_mute(False)
             self.mute_button.set_icon_name('audio-volume-high')
         else:
-            self.playbin.set_property("mute", True)
+            self.player.set_mute(True)
             self.mute_button.set_icon_name('audio-volume-muted')
 
     def play(self, view, path):
-        url = self.model[path][1]
-        if url.endswith(".pls"):
-            url = self.getURLfromPLS(url)
-        elif url.endswith(".m3u"):
-            url = self.getURLfromM3U(url)
-        else:
-            url = self.model[path][1]
-        print(f"{self.model[path][0]} - {url}")
-        self.playbin.set_state(Gst.State.NULL)
-        self.playbin.set_property('uri', url)
-        self.playbin.set_state(Gst.State.PLAYING)
-        self.playbin.set_property("mute", False)
+        self.player.play(self.model[path][0], self.model[path][1])
         self.set_title(self.model[path][0])
-        self.stop_button.set_sensitive(True)
 
     def stop(self, button):
-        self.playbin.set_state(Gst.State.NULL)
-        self.stop_button.set_sensitive(False)
+        self.player.stop()
         
-    def on_tag(self, bus, msg):
-        if not msg == None:
-            taglist = msg.parse_tag()
-            if not taglist == None:
-                my_tag = f'{taglist.get_string(taglist.nth_tag_name(0)).value}'
-                if my_tag:
-                    if not self.old_tag == my_tag and not my_tag == "None":
-                        print(my_tag)
-                        self.tag_label.set_markup(f'<b><span foreground="#55aaff" size="x-large">{my_tag}</span></b>')
-                        self.old_tag = my_tag
+    def on_state(self, player, playing):
+        self.stop_button.set_sensitive(playing)
+        
+    def on_status(self, player, text):
+        if text:
+            self.tag_label.set_text(text)
+        else:
+            self.on_title(player, player.title)
+        
+    def on_title(self, player, title):
+        if title and not player.buffering:
+            self.tag_label.set_markup(f'<b><span foreground="#55aaff" size="x-large">{GLib.markup_escape_text(title)}</span></b>')
 
     def find_stations(self, *args):
         self.playlist = "#EXTM3U\n"
-        i = 0
         self.model.clear()
         mysearch = self.search_entry.get_text()
         if mysearch == "":
             self.tag_label.set_text("please enter search term")
             return
-        rb = RadioBrowser()
+        rb = radiocore.browser.RadioBrowser()
         if self.country_code.get_text() == "":
             print("country_code:", "None")
             myparams = {'name': 'search', 'nameExact': 'false'}
@@ -283,17 +198,27 @@ class FinderWindow(Gtk.ApplicationWindow):
                 if key == "name":
                     myparams[key] = mysearch
         
-        r = rb.station_search(params=myparams)
+        ### run the request in the pool, never on the main loop
+        self.tag_label.set_text(f"searching '{mysearch}' ...")
+        self.search.start(mysearch, rb.station_search,
+                          lambda r: self.show_results(r, mysearch),
+                          lambda error: self.tag_label.set_text(f"search for '{mysearch}' failed"),
+                          params=myparams)
         
+    def on_search_changed(self, entry):
+        self.search.changed(entry.get_text())
+            
+    def show_results(self, r, mysearch):
+        i = 0
         n = ""
         m = ""
+        icon_image = load_icon("icon.png")
         for i in range(len(r)):
             for key,value in r[i].items():
                 if str(key) == "name":
                     n = value.replace(",", " ")
                 if str(key) == "url":
                     m = value
-                    icon_image = GdkPixbuf.Pixbuf.new_from_file("icon.png").scale_simple(20, 20, GdkPixbuf.InterpType.NEAREST)
                     self.model.append((n, m, icon_image))
                     self.playlist += f"#EXTINF:{i+1},{n}\n{m}\n"
         if i > 0:
@@ -302,46 +227,6 @@ class FinderWindow(Gtk.ApplicationWindow):
         else:
             self.tag_label.set_text(f"found no stations that contains '{mysearch}'")
                     
-    def getURLfromPLS(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("pls detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
-        else:
-           print("no urls found") 
-    
-    def getURLfromM3U(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("m3u detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
-        else:
-           print("no urls found") 
-        
     def save_playlist(self, *args):
         if self.playlist == "" or self.playlist == "#EXTM3U\n":
             return
@@ -375,6 +260,8 @@ class MyApp(Adw.Application):
         
     def on_activate(self, app, *args, **kwargs):
         self.win = FinderWindow(application=app)
+        startup.report_first_frame(self.win, self.quit)
+        startup.preload(SEARCH_POOL, "radiocore.browser")
         self.win.present()
         
            
@@ -3,17 +3,44 @@
 
 import gi
 gi.require_versions({'Gtk': '4.0', 'Gst': '1.0', 'Adw': '1'})
-from gi.repository import Gtk, GdkPixbuf, Gst, Gio, Adw, GObject
-import requests
-import configparser
+from gi.repository import Gtk, GdkPixbuf, Gio, Adw, GObject, GLib
 import sys
-import socket
 import warnings
+import os
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+import importlib
+from concurrent.futures import ThreadPoolExecutor, Future
+import radiocore
+from radiocore import control, startup
+from radiocore.favorites import FavoritesStore, read_playlist
+from radiocore.icons import load_icon
+from radiocore.resolver import RESOLVER
+from radiocore.metadata import MetadataHistory
+from radiocore.player import Player
+
+### requests, the search stack and sqlite load after the window is up
+CLIENT = radiocore.LazyObject("client", "CLIENT")
+SEARCH_CACHE = radiocore.LazyObject("browser", "SEARCH_CACHE")
+STATIONS = radiocore.LazyObject("stationdb", "STATIONS")
+PROBER = radiocore.LazyObject("prober", "PROBER")
 
 warnings.filterwarnings("ignore")
 
-CONFIG = configparser.ConfigParser(strict=False)
-#CONFIG.read('config_d')
+### station searches run here, results go back to the main loop via GLib.idle_add
+SEARCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search")
+SEARCH_BATCH_SIZE = 50 # rows handed to the model at once
+SEARCH_PAGE_SIZE = 200 # stations fetched per page, the next page loads near the bottom
+SEARCH_MAX_ROWS = 5000 # no more pages beyond this, refine the search instead
+LIVE_SEARCH = True # search while typing
+LIVE_SEARCH_DELAY = 400 # ms without typing before a search starts
+LIVE_SEARCH_MIN_CHARS = 3
+
+### a second paused playbin holds the next station connected and buffered
+PREROLL = True
+PREROLL_DELAY = 300 # ms the pointer rests on a station before it is prerolled
 
 all_country_codes = """All Countries    
 United States    US
@@ -52,122 +79,202 @@ Spain    ES
 Switzerland    CH
 Sweden    SE"""
 
-def get_radiobrowser_base_urls():
-    ### Get all base urls of all currently available radiobrowser servers
-    hosts = []
-    ips = socket.getaddrinfo('all.api.radio-browser.info',
-                             80, 0, 0, socket.IPPROTO_TCP)
-    for ip_tupple in ips:
-        ip = ip_tupple[4][0]
-        host_addr = socket.gethostbyaddr(ip)
-        if host_addr[0] not in hosts:
-            hosts.append(host_addr[0])
-
-    hosts.sort()
-    return list(map(lambda x: "https://" + x, hosts))
-
-# list of urls, use last
-for host in get_radiobrowser_base_urls()[-1:]:
-    BASE_URL =  f"{host}/"
-    
-print(f"BASE_URL={BASE_URL}")
-
-### get working urls at https://api.radio-browser.info/examples/serverlist_python3.py
-### https://de1.api.radio-browser.info/
-### https://nl1.api.radio-browser.info/
-### https://de2.api.radio-browser.info/
-
-endpoints = {
-    "countries": {1: "{fmt}/countries", 2: "{fmt}/countries/{filter}"},
-    "codecs": {1: "{fmt}/codecs", 2: "{fmt}/codecs/{filter}"},
-    "states": {
-        1: "{fmt}/states",
-        2: "{fmt}/states/{filter}",
-        3: "{fmt}/states/{country}/{filter}",
-    },
-    "languages": {1: "{fmt}/languages", 2: "{fmt}/languages/{filter}"},
-    "tags": {1: "{fmt}/tags", 2: "{fmt}/tags/{filter}"},
-    "stations": {1: "{fmt}/stations", 3: "{fmt}/stations/{by}/{search_term}"},
-    "playable_station": {3: "{ver}/{fmt}/url/{station_id}"},
-    "station_search": {1: "{fmt}/stations/search"},
-}
-
-def request(endpoint, **kwargs):
-
-    fmt = kwargs.get("format", "json")
-
-    if fmt == "xml":
-        content_type = f"application/{fmt}"
-    else:
-        content_type = f"application/{fmt}"
-
-    headers = {"content-type": content_type, "User-Agent": "getRadiolist/1.0"}
-
-    params = kwargs.get("params", {})
-
-    url = BASE_URL + endpoint
-
-    resp = requests.get(url, headers=headers, params=params)
-
-    if resp.status_code == 200:
-        if fmt == "xml":
-            return resp.text
-        return resp.json()
+class Widget(GObject.Object):
+    __gtype_name__ = 'Widget'
 
-    return resp.raise_for_status()
+    def __init__(self, name):
+        super().__init__()
+        self._name = name
 
+    @GObject.Property
+    def name(self):
+        return self._name
+        
+class Station(GObject.Object):
+    __gtype_name__ = 'Station'
 
-class EndPointBuilder:
-    def __init__(self, fmt="json"):
-        self.fmt = fmt
-        self._option = None
-        self._endpoint = None
+    def __init__(self, name, url, icon=None):
+        super().__init__()
+        self._name = name
+        self._url = url
+        self.icon = icon
 
-    @property
-    def endpoint(self):
-        return endpoints[self._endpoint][self._option]
+    @GObject.Property
+    def name(self):
+        return self._name
 
-    def produce_endpoint(self, **parts):
-        self._option = len(parts)
-        self._endpoint = parts["endpoint"]
-        parts.update({"fmt": self.fmt})
-        return self.endpoint.format(**parts)
+    @GObject.Property
+    def url(self):
+        return self._url
         
-class Widget(GObject.Object):
-    __gtype_name__ = 'Widget'
+### a search result, the grid item redraws when icon or info change
+class SearchResult(GObject.Object):
+    __gtype_name__ = 'SearchResult'
+    icon = GObject.Property(type=GdkPixbuf.Pixbuf)
+    info = GObject.Property(type=str, default="")
 
-    def __init__(self, name):
-        super().__init__()
+    def __init__(self, name, url, icon, favicon="", state=0, info=""):
+        super().__init__(icon=icon, info=info)
         self._name = name
+        self._url = url
+        self.favicon = favicon
+        self.state = state
 
     @GObject.Property
     def name(self):
         return self._name
 
-class RadioBrowser:
-    def __init__(self, fmt="json"):
-        self.fmt = fmt
-        self.builder = EndPointBuilder(fmt=self.fmt)
+    @GObject.Property
+    def url(self):
+        return self._url
+
+FAVORITES = FavoritesStore()
+
+PRERESOLVE = True # resolve playlists of visible results and favorites before they are clicked
+PRERESOLVE_FAVORITES = 50 # favorites resolved after startup
 
-    def stations(self, **params):
-        endpoint = self.builder.produce_endpoint(endpoint="stations")
-        kwargs = {}
-        if params:
-            kwargs.update({"params": params})
-        return request(endpoint, **kwargs)
+DIMMED = {}
 
-    def stations_byname(self, name):
-        endpoint = self.builder.produce_endpoint(
-            endpoint="stations", by="byname", search_term=name
-        )
-        return request(endpoint)
+def dim_icon(pixbuf):
+    dimmed = DIMMED.get(pixbuf)
+    if dimmed is None:
+        if len(DIMMED) > THUMBNAIL_MEMORY:
+            DIMMED.clear()
+        dimmed = pixbuf.copy()
+        pixbuf.saturate_and_pixelate(dimmed, 0.0, False)
+        DIMMED[pixbuf] = dimmed
+    return dimmed
+
+### station favicons, fetched only for visible rows and cached scaled on disk and in memory
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_SIZE = 20
+THUMBNAIL_WORKERS = 4
+THUMBNAIL_MEMORY = 500 # pixbufs kept in memory
+THUMBNAIL_FILES = 5000 # scaled favicons kept on disk
+THUMBNAIL_MAX_BYTES = 512 * 1024
+THUMBNAIL_TIMEOUT = (3, 5) # connect, read
+THUMBNAIL_DELAY = 150 # ms to wait for scrolling to settle
+THUMBNAIL_RETRY = 10 * 60 # seconds before a failed favicon is tried again
+
+class ThumbnailLoader:
+    def __init__(self, directory=THUMBNAIL_DIR, size=THUMBNAIL_SIZE):
+        self.directory = directory
+        self.size = size
+        self.pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+        self.memory = OrderedDict()
+        self.pending = {}
+        self.failed = {} # url -> time of the failure
+        self.wanted = set()
+        self.saved = 0
+        
+    def cache_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + ".png")
+        
+    def get(self, url):
+        pixbuf = self.memory.get(url)
+        if pixbuf is not None:
+            self.memory.move_to_end(url)
+        return pixbuf
+        
+    def set_wanted(self, urls):
+        ### downloads that are no longer visible are skipped by the workers
+        self.wanted = set(urls)
+        
+    def request(self, url, callback):
+        ### callback(url, pixbuf) runs on the main loop, one download per url
+        if time.time() - self.failed.get(url, 0) < THUMBNAIL_RETRY:
+            return
+        if url in self.pending:
+            self.pending[url].append(callback)
+            return
+        self.pending[url] = [callback]
+        future = self.pool.submit(self.load, url)
+        future.add_done_callback(lambda future: GLib.idle_add(self.on_loaded, url, future))
+        
+    def load(self, url):
+        ### runs in a worker, download, decode and downscale off the main loop
+        path = self.cache_path(url)
+        if os.path.exists(path):
+            os.utime(path)
+            return GdkPixbuf.Pixbuf.new_from_file(path)
+        if url not in self.wanted:
+            return None
+        resp = CLIENT.get(url, stream=True, timeout=THUMBNAIL_TIMEOUT)
+        loader = GdkPixbuf.PixbufLoader()
+        try:
+            resp.raise_for_status()
+            received = 0
+            for chunk in resp.iter_content(chunk_size=16 * 1024):
+                received += len(chunk)
+                if received > THUMBNAIL_MAX_BYTES:
+                    raise ValueError(f"favicon too large: {url}")
+                loader.write(chunk)
+        except Exception:
+            ### a loader that is not closed warns when it is freed
+            try:
+                loader.close()
+            except GLib.Error:
+                pass
+            raise
+        finally:
+            resp.close()
+        loader.close()
+        pixbuf = loader.get_pixbuf()
+        if pixbuf is None:
+            raise ValueError(f"favicon not readable: {url}")
+        scale = self.size / max(pixbuf.get_width(), pixbuf.get_height())
+        pixbuf = pixbuf.scale_simple(max(1, round(pixbuf.get_width() * scale)),
+                                     max(1, round(pixbuf.get_height() * scale)),
+                                     GdkPixbuf.InterpType.BILINEAR)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pixbuf.savev(tmp, "png", [], [])
+        os.replace(tmp, path)
+        self.saved += 1
+        if self.saved % 100 == 0:
+            self.prune()
+        return pixbuf
+        
+    def prune(self):
+        ### drop the least recently used files beyond THUMBNAIL_FILES
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".png")]
+        if len(files) <= THUMBNAIL_FILES:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - THUMBNAIL_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+                
+    def on_loaded(self, url, future):
+        callbacks = self.pending.pop(url, [])
+        try:
+            pixbuf = future.result()
+        except Exception as e:
+            print("favicon failed:", url, e)
+            now = time.time()
+            if len(self.failed) > THUMBNAIL_MEMORY:
+                self.failed = {key: stamp for key, stamp in self.failed.items() if now - stamp < THUMBNAIL_RETRY}
+            self.failed[url] = now
+            return False
+        if pixbuf is None:
+            return False
+        self.memory[url] = pixbuf
+        while len(self.memory) > THUMBNAIL_MEMORY:
+            self.memory.popitem(last=False)
+        for callback in callbacks:
+            callback(url, pixbuf)
+        return False
+        
+THUMBNAILS = ThumbnailLoader()
 
-    def station_search(self, params, **kwargs):
-        assert isinstance(params, dict), "params must be a dictionary."
-        kwargs["params"] = params
-        endpoint = self.builder.produce_endpoint(endpoint="station_search")
-        return request(endpoint, **kwargs)
+### stream urls are checked in the background, dead stations are greyed out
+PROBE_STREAMS = True
+PROBE_SORT_DELAY = 1000 # ms, verdicts arriving in this window cause one resort
 
+HISTORY_SHOWN = 50 # titles in the history popup
+HISTORY = MetadataHistory()
 
 class FinderWindow(Gtk.ApplicationWindow):
     def __init__(self, *args, **kwargs):
@@ -181,7 +288,6 @@ class FinderWindow(Gtk.ApplicationWindow):
         
         self.playlist = ""
         self.set_icon_name('applications-multimedia')
-        self.old_tag = ""
 
         self.header = Gtk.HeaderBar()
         self.header.set_show_title_buttons(True)
@@ -192,6 +298,16 @@ class FinderWindow(Gtk.ApplicationWindow):
         self.remove_button.connect("clicked", self.delete_channel)
         
         self.header.pack_start(self.remove_button)
+        
+        self.import_button = Gtk.Button.new_from_icon_name('document-open')
+        self.import_button.set_tooltip_text("import a m3u / pls playlist into Favorites")
+        self.import_button.connect("clicked", self.import_favorites)
+        self.header.pack_start(self.import_button)
+        
+        self.export_button = Gtk.Button.new_from_icon_name('document-save-as')
+        self.export_button.set_tooltip_text("export Favorites as m3u / pls playlist")
+        self.export_button.connect("clicked", self.export_favorites)
+        self.header.pack_start(self.export_button)
 
         self.stop_button = Gtk.Button.new_from_icon_name('media-playback-stop-symbolic')
         self.stop_button.set_tooltip_text("stop playing")
@@ -212,17 +328,58 @@ class FinderWindow(Gtk.ApplicationWindow):
         self.mute_button.set_tooltip_text("mute / unmute")
         self.mute_button.connect("clicked", self.set_mute_status)
         
+        self.offline_button = Gtk.ToggleButton(icon_name='network-offline')
+        self.offline_button.set_tooltip_text("search the offline station database\nthe full station list is downloaded once")
+        self.offline_button.connect("toggled", self.offline_toggled)
+        
+        self.dead_last_button = Gtk.ToggleButton(icon_name='view-sort-descending')
+        self.dead_last_button.set_tooltip_text("move stations that do not answer to the end")
+        self.dead_last_button.connect("toggled", self.schedule_sort)
+        
+        self.history_label = Gtk.Label(selectable=True, xalign=0)
+        history_scroll = Gtk.ScrolledWindow(min_content_width=420, min_content_height=360)
+        history_scroll.set_child(self.history_label)
+        history_popover = Gtk.Popover(child=history_scroll)
+        history_popover.connect("show", self.show_history)
+        self.history_button = Gtk.MenuButton(icon_name='document-open-recent', popover=history_popover)
+        self.history_button.set_tooltip_text("recently played titles")
+        
         
         self.search_entry = Gtk.SearchEntry(placeholder_text = "find radio stations ...", 
                                             tooltip_text = "find radio stations ...\nyou can use country code at bottom\n or search without country code", 
                                             margin_start=6, margin_end=0)
         self.search_entry.connect("activate", self.find_stations)
+        self.search_entry.set_search_delay(LIVE_SEARCH_DELAY)
+        self.search_entry.connect("search-changed", self.live_search)
+        
+        self.search_future = None
+        self.search_generation = 0
+        self.search_lock = threading.Lock()
+        self.search_response = None # the streamed response of the search in flight
+        self.search_text = ""
+        self.search_params = None
+        self.search_offset = 0
+        self.search_exhausted = True
+        self.search_results = []
+        self.search_superset = None
+        self.search_waiters = [] # control socket searches waiting for the first page
+        self.control_query = None
 
         self.header.pack_start(self.stop_button)        
         self.header.pack_start(self.mute_button)
+        self.header.pack_end(self.offline_button)
+        self.header.pack_end(self.dead_last_button)
+        self.header.pack_end(self.history_button)
 
-        self.model = Gtk.ListStore(object)
-        self.model.set_column_types((str, str, GdkPixbuf.Pixbuf))
+        ### the grid only creates widgets for the visible results
+        self.results = Gio.ListStore(item_type=SearchResult)
+        self.results_selection = Gtk.SingleSelection(model=self.results, autoselect=False, can_unselect=True)
+        self.results_selection.connect("notify::selected-item", self.result_selection_changed)
+        self.playing_result = None
+        self.shown_results = {} # results bound to a grid item, in the order they were bound
+        self.thumbnail_timeout = None
+        self.probe_rows = {} # url -> results waiting for a verdict
+        self.sort_timeout = None
         
         radiobox = Gtk.Box(orientation=1, homogeneous=False)
         
@@ -231,17 +388,20 @@ class FinderWindow(Gtk.ApplicationWindow):
         radiobox.append(radio_lbl)
         radiobox.append(self.search_entry)
 
-        self.icon_view = Gtk.IconView()
+        factory_result = Gtk.SignalListItemFactory()
+        factory_result.connect("setup", self._on_factory_result_setup)
+        factory_result.connect("bind", self._on_factory_result_bind)
+        factory_result.connect("unbind", self._on_factory_result_unbind)
+
+        self.icon_view = Gtk.GridView(model=self.results_selection, factory=factory_result)
         self.icon_view.set_vexpand(True)
-        self.icon_view.set_model(self.model)
-        self.icon_view.set_item_width(90)
-        self.icon_view.set_text_column(0)
-        self.icon_view.set_pixbuf_column(2)
-        self.icon_view.set_activate_on_single_click(True)
-        self.icon_view.connect('item-activated', self.play)
+        self.icon_view.connect('activate', self.play)
 
         self.scroll = Gtk.ScrolledWindow(hexpand = True)
         self.scroll.set_child(self.icon_view)
+        self.scroll.get_vadjustment().connect("value-changed", self.on_scroll_changed)
+        ### emitted once a page is laid out, a page that does not fill the view loads the next one
+        self.scroll.get_vadjustment().connect("changed", self.load_more)
         
         vbox = Gtk.Box(orientation=1, homogeneous=False, spacing=10)
         self.set_child(vbox)
@@ -251,8 +411,14 @@ class FinderWindow(Gtk.ApplicationWindow):
         hbox.append(radiobox)
         
         ########################################################
-        self.radio_model = Gtk.ListStore(object)
-        self.radio_model.set_column_types((str, str, GdkPixbuf.Pixbuf))
+        self.radio_model = Gio.ListStore(item_type=Station)
+        self.filter_model_radio = Gtk.FilterListModel(model=self.radio_model)
+        self.filter_radio = Gtk.CustomFilter.new(self._do_filter_radio_view, self.filter_model_radio)
+        self.filter_model_radio.set_filter(self.filter_radio)
+        self.radio_selection = Gtk.SingleSelection(model=self.filter_model_radio, autoselect=False, can_unselect=True)
+        self.radio_selection.connect("notify::selected-item", self.radio_selection_changed)
+        self.search_text_radio = ''
+        self.playing_radio = None
         favbox = Gtk.Box(orientation=1, homogeneous=False)
         
         self.search_fav_entry = Gtk.SearchEntry(placeholder_text = "filter favorites ...", 
@@ -261,14 +427,13 @@ class FinderWindow(Gtk.ApplicationWindow):
         self.search_fav_entry.connect("activate", self.visible_cb)
         self.search_fav_entry.connect("search-changed", self.fav_entry_search_changed)
 
-        self.icon_view_radio = Gtk.IconView()
+        factory_radio = Gtk.SignalListItemFactory()
+        factory_radio.connect("setup", self._on_factory_radio_setup)
+        factory_radio.connect("bind", self._on_factory_radio_bind)
+
+        self.icon_view_radio = Gtk.GridView(model=self.radio_selection, factory=factory_radio)
         self.icon_view_radio.set_vexpand(True)
-        self.icon_view_radio.set_model(self.radio_model)
-        self.icon_view_radio.set_item_width(90)
-        self.icon_view_radio.set_text_column(0)
-        self.icon_view_radio.set_pixbuf_column(2)
-        self.icon_view_radio.set_activate_on_single_click(True)
-        self.icon_view_radio.connect('item-activated', self.play_radio)
+        self.icon_view_radio.connect('activate', self.play_radio)
         
         self.radio_scroll = Gtk.ScrolledWindow()
         self.radio_scroll.set_child(self.icon_view_radio)
@@ -313,9 +478,6 @@ class FinderWindow(Gtk.ApplicationWindow):
         
         self.country_code_box = Gtk.DropDown(model=self.filter_model_widget, factory=factory_widget)
         self.country_code_box.set_tooltip_text("choose country code")
-        for country in all_country_codes.splitlines():
-            e_code = country
-            self.model_widget.append(Widget(name=e_code))
         self.country_code_box.connect("notify::selected-item", self.country_code_box_changed)
         
         self.country_code.connect("activate", self.find_stations)
@@ -352,19 +514,53 @@ class FinderWindow(Gtk.ApplicationWindow):
         vbox.append(self.tag_label)
         vbox.append(self.status_bar)
 
-        Gst.init('')
-        self.playbin = Gst.ElementFactory.make('playbin', 'player')
+        ### the spare player prerolls the station that is likely played next
+        self.player = Player(preroll=PREROLL, history=HISTORY)
+        self.player.connect("title-changed", self.update_tag_label)
+        self.player.connect("status", self.on_player_status)
+        self.player.connect("state-changed", self.on_player_state)
+        self.control = control.ControlServer({
+            "search": self.control_search,
+            "results": self.search_rows,
+            "play": self.control_play,
+            "play-result": self.control_play_result,
+            "stop": lambda: self.stop(None),
+            "volume": lambda value=None: control.volume(self.vol_slider.get_value, self.vol_slider.set_value, value),
+            "mute": lambda state=None: control.mute(self.player, self.set_mute_status, state),
+            "status": lambda: control.player_status(self.player),
+            "favorites": lambda: [(name, url) for url, name in FAVORITES.items()],
+            "add-favorite": self.add_favorite,
+            "remove-favorite": self.control_remove_favorite,
+        }, control.socket_path("radiofinder"))
+        control.publish_player(self.control, self.player)
+        try:
+            self.control.start()
+        except OSError as e:
+            print("no control socket:", e)
+        self.preroll_timeout = None
         
-        ### Listen for metadata
-        self.old_tag = None
-        self.bus = self.playbin.get_bus()
-        self.bus.enable_sync_message_emission()
-        self.bus.add_signal_watch()
-        self.bus.connect('message::tag', self.on_tag)
+        self.search_entry.grab_focus()
+        startup.after_first_frame(self.finish_startup)
         
+    def finish_startup(self):
+        self.model_widget.splice(0, 0, [Widget(name=country) for country in all_country_codes.splitlines()])
         self.read_channels()
+        ### favorites the daemon adds or removes show up here too
+        FAVORITES.watch(self.read_channels)
+        if PRERESOLVE:
+            RESOLVER.prefetch(url for url, name in FAVORITES.items()[:PRERESOLVE_FAVORITES])
+        SEARCH_POOL.submit(self.warm_up)
+        return False
         
-        self.search_entry.grab_focus()
+    def warm_up(self):
+        ### runs in the pool, the first search does not wait for these imports
+        importlib.import_module("radiocore.browser")
+        if not STATIONS.supported():
+            GLib.idle_add(self.disable_offline)
+            return
+        ### keep an existing offline database up to date
+        if STATIONS.exists() and STATIONS.needs_sync():
+            STATIONS.sync_in_background()
         
     def _on_factory_widget_setup(self, factory, list_item):
         box = Gtk.Box(spacing=6, orientation=Gtk.Orientation.HORIZONTAL)
@@ -381,64 +577,103 @@ class FinderWindow(Gtk.ApplicationWindow):
     def _do_filter_widget_view(self, item, filter_list_model):
         return self.search_text_widget.upper() in item.name.upper()
         
+    def _on_factory_radio_setup(self, factory, list_item):
+        box = Gtk.Box(spacing=2, orientation=Gtk.Orientation.VERTICAL, width_request=90)
+        image = Gtk.Image()
+        box.append(image)
+        label = Gtk.Label(wrap=True, max_width_chars=12, justify=Gtk.Justification.CENTER)
+        box.append(label)
+        list_item.set_child(box)
+        
+    def _on_factory_radio_bind(self, factory, list_item):
+        box = list_item.get_child()
+        image = box.get_first_child()
+        label = image.get_next_sibling()
+        station = list_item.get_item()
+        image.set_from_pixbuf(station.icon)
+        label.set_text(station.name)
+        
+    def _on_factory_result_setup(self, factory, list_item):
+        box = Gtk.Box(spacing=2, orientation=Gtk.Orientation.VERTICAL, width_request=90)
+        image = Gtk.Image()
+        box.append(image)
+        label = Gtk.Label(wrap=True, max_width_chars=12, justify=Gtk.Justification.CENTER)
+        box.append(label)
+        if PREROLL:
+            motion = Gtk.EventControllerMotion()
+            motion.connect("enter", self.on_result_enter, list_item)
+            motion.connect("leave", self.on_result_leave)
+            box.add_controller(motion)
+        list_item.set_child(box)
+        
+    def _on_factory_result_bind(self, factory, list_item):
+        box = list_item.get_child()
+        result = list_item.get_item()
+        box.get_last_child().set_text(result.name)
+        self.show_result(result, None, box)
+        box.handler = result.connect("notify", self.show_result, box)
+        self.shown_results[result] = None
+        self.schedule_thumbnails()
+        
+    def _on_factory_result_unbind(self, factory, list_item):
+        result = list_item.get_item()
+        result.disconnect(list_item.get_child().handler)
+        self.shown_results.pop(result, None)
+        
+    @staticmethod
+    def show_result(result, pspec, box):
+        box.get_first_child().set_from_pixbuf(result.icon)
+        box.set_tooltip_text(result.info or None)
+        
+    def _do_filter_radio_view(self, item, filter_list_model):
+        return self.search_text_radio in item.name.lower()
+        
     def refresh_filter(self,widget):
         self.filter.refilter()
         
     def fav_entry_search_changed(self, entry, *args):
+        ### only refilter, longer queries just check the rows still shown
         search_query = entry.get_text().lower()
-        if search_query == "":
-            self.read_channels()
-        for row in self.radio_model:
-            if not search_query in row[0].lower():
-                path = row.path
-                iter = self.radio_model.get_iter(path)
-                self.radio_model.remove(iter)
+        if search_query == self.search_text_radio:
+            return
+        if search_query.startswith(self.search_text_radio):
+            change = Gtk.FilterChange.MORE_STRICT
+        elif self.search_text_radio.startswith(search_query):
+            change = Gtk.FilterChange.LESS_STRICT
+        else:
+            change = Gtk.FilterChange.DIFFERENT
+        self.search_text_radio = search_query
+        self.filter_radio.changed(change)
         
     def visible_cb(self, entry, *args):
-        search_query = entry.get_text().lower()
-        for row in self.radio_model:
-            if not search_query in row[0].lower():
-                path = row.path
-                iter = self.radio_model.get_iter(path)
-                self.radio_model.remove(iter)
+        self.fav_entry_search_changed(entry)
         
     def handle_close(self, *args):
         self.write_channels()
             
-    def delete_channel(self, path, *args):
+    def delete_channel(self, *args):
         # check selection
-        if self.icon_view_radio.get_selected_items():
-            iter = self.radio_model.get_iter(self.icon_view_radio.get_selected_items()[0])
-            path = self.icon_view_radio.get_selected_items()[0]
-            name = self.radio_model.get_value (iter, 0)
-            self.radio_model.remove(iter)
-            print(f"{name} removed")
-            CONFIG.remove_section(name)
-            self.write_channels()
-            self.read_channels()
+        station = self.radio_selection.get_selected_item()
+        if station is not None:
+            position = self.radio_selection.get_selected()
+            found, index = self.radio_model.find(station)
+            if found:
+                self.radio_model.remove(index)
+            print(f"{station.name} removed")
+            FAVORITES.remove(station.url)
             
-            self.icon_view_radio.select_path(path)
-            self.icon_view_radio.emit("item-activated", path)
+            if position < self.filter_model_radio.get_n_items():
+                self.radio_selection.set_selected(position)
         
         
     def write_channels(self):        
-        channels = ""
-        item = self.radio_model.get_iter_first ()
-
-        while ( item != None ):
-            channels += (f"[{self.radio_model.get_value (item, 0)}]\nurl={self.radio_model.get_value (item, 1)}\n")
-            item = self.radio_model.iter_next(item)
-
-        with open("config_d", 'w') as f:
-            f.write(f"\n{channels}")
+        FAVORITES.close()
 
         
     def read_channels(self):
-        self.radio_model.clear()
-        CONFIG.read('config_d')
-        for section in CONFIG.sections(): # sorted(CONFIG.sections(), key=str.lower): #
-            icon_image = GdkPixbuf.Pixbuf.new_from_file("icon_fav.png").scale_simple(20, 20, GdkPixbuf.InterpType.NEAREST)
-            self.radio_model.append((section, CONFIG[section]['url'], icon_image))
+        icon_image = load_icon("icon_fav.png")
+        stations = [Station(name, url, icon_image) for url, name in FAVORITES.items()]
+        self.radio_model.splice(0, self.radio_model.get_n_items(), stations)
         
     def country_code_box_changed(self, dropdown, data):
         if self.search_entry.get_text():
@@ -449,87 +684,192 @@ class FinderWindow(Gtk.ApplicationWindow):
                 self.find_stations()        
         
     def transfer_channel(self, *args):
-        selected_path = self.icon_view.get_selected_items()[0]
-        selected_iter = self.icon_view.get_model().get_iter(selected_path)
-
-        name = self.icon_view.get_model().get_value(selected_iter, 0)
-        url = self.icon_view.get_model().get_value(selected_iter, 1)
-        channel = f"[{name}]\nurl={url}"
-        print(channel)
-        with open("config_d", 'a') as f:
-            f.write(f"\n{channel}")
-        self.read_channels()
+        result = self.results_selection.get_selected_item()
+        if result is None:
+            return
+        try:
+            self.add_favorite(result.name, result.url)
+        except ValueError:
+            self.tag_label.set_text(f"{result.name} is already in Favorites")
+            
+    def add_favorite(self, name, url):
+        if not FAVORITES.add(name, url):
+            raise ValueError(f"{name} is already in Favorites")
+        print(f"{name} added")
+        self.radio_model.append(Station(name, url, load_icon("icon_fav.png")))
+        return len(FAVORITES)
+        
+    def search_rows(self):
+        return [(result.name, result.url) for result in self.results]
+        
+    def control_play(self, what):
+        what = str(what)
+        if "://" in what:
+            name, url = what, what
+        else:
+            url, name = control.pick(FAVORITES.items(), what, "favorite")
+        self.play_station(name, url)
+        self.release_radio_selection()
+        return name
+        
+    def control_play_result(self, number):
+        name, url = control.pick(self.search_rows(), number, "search result")
+        self.play_station(name, url)
+        self.release_radio_selection()
+        return name
+        
+    def control_remove_favorite(self, what):
+        what = str(what)
+        url = what if "://" in what else control.pick(FAVORITES.items(), what, "favorite")[0]
+        if not FAVORITES.remove(url):
+            raise LookupError(f"{url} is not in Favorites")
+        for index in range(self.radio_model.get_n_items()):
+            if self.radio_model.get_item(index).url == url:
+                self.radio_model.remove(index)
+                break
+        return len(FAVORITES)
+        
+    def control_search(self, term, country=""):
+        ### answered with the first page, the window shows the search as if it was typed
+        term = str(term)
+        if not term.strip():
+            raise ValueError("empty search")
+        self.country_code.set_text(str(country))
+        if self.search_entry.get_text() != term:
+            self.control_query = term
+            self.search_entry.set_text(term)
+        self.find_stations()
+        waiter = Future()
+        if self.search_future is None:
+            waiter.set_result(self.search_rows())
+        else:
+            self.search_waiters.append(waiter)
+        return waiter
+        
+    def finish_search_waiters(self, error=None):
+        waiters, self.search_waiters = self.search_waiters, []
+        for waiter in waiters:
+            if error is None:
+                waiter.set_result(self.search_rows())
+            else:
+                waiter.set_exception(error)
             
             
     def set_volume(self, *args):
         vol = self.vol_slider.get_value()
         self.volume_label.set_text(f"Volume: {vol * 100:.0f}")
-        self.playbin.set_property("volume", vol)
+        self.player.set_volume(vol)
         
     def set_mute_status(self, *args):
-        if self.playbin.get_property("mute") == True:
-            self.playbin.set_property("mute", False)
+        if self.player.get_mute():
+            self.player.set_mute(False)
             self.mute_button.set_icon_name('audio-volume-high')
         else:
-            self.playbin.set_property("mute", True)
+            self.player.set_mute(True)
             self.mute_button.set_icon_name('audio-volume-muted')
 
-    def play(self, view, path):
-        url = self.model[path][1]
-        if url.endswith(".pls"):
-            url = self.getURLfromPLS(url)
-        elif url.endswith(".m3u"):
-            url = self.getURLfromM3U(url)
-        else:
-            url = self.model[path][1]
-        print(f"{self.model[path][0]} - {url}")
-        self.playbin.set_state(Gst.State.NULL)
-        self.playbin.set_property('uri', url)
-        self.playbin.set_state(Gst.State.PLAYING)
-        self.playbin.set_property("mute", False)
-        self.set_title(self.model[path][0])
-        self.stop_button.set_sensitive(True)
-        
-    def play_radio(self, view, path):
-        url = self.radio_model[path][1]
-        if url.endswith(".pls"):
-            url = self.getURLfromPLS(url)
-        elif url.endswith(".m3u"):
-            url = self.getURLfromM3U(url)
+    def play(self, view, position):
+        self.play_result(self.results.get_item(position))
+        
+    def result_selection_changed(self, selection, *args):
+        ### a click selects and plays like in the favorites, activating plays again
+        if selection.get_selected_item() is not self.playing_result:
+            self.play_result(selection.get_selected_item())
+        
+    def play_result(self, result):
+        if result is None:
+            return
+        self.playing_result = result
+        self.play_station(result.name, result.url)
+        self.release_radio_selection()
+        
+    def play_station(self, name, url):
+        self.set_title(name)
+        self.player.play(name, url)
+        
+    def on_player_state(self, player, playing):
+        self.stop_button.set_sensitive(playing)
+        
+    def on_player_status(self, player, text):
+        ### an empty status brings the title back
+        if text:
+            self.tag_label.set_text(text)
         else:
-            url = self.radio_model[path][1]
-        print(f"{self.radio_model[path][0]} - {url}")
-        self.playbin.set_state(Gst.State.NULL)
-        self.playbin.set_property('uri', url)
-        self.playbin.set_state(Gst.State.PLAYING)
-        self.playbin.set_property("mute", False)
-        self.set_title(self.radio_model[path][0])
-        self.stop_button.set_sensitive(True)
+            self.update_tag_label()
+        
+    def on_result_enter(self, controller, x, y, list_item):
+        ### the station under the pointer is prerolled once the pointer rests
+        self.on_result_leave(controller)
+        self.preroll_timeout = GLib.timeout_add(PREROLL_DELAY, self.preroll_hovered, list_item)
+        
+    def on_result_leave(self, controller):
+        if self.preroll_timeout is not None:
+            GLib.source_remove(self.preroll_timeout)
+            self.preroll_timeout = None
+        
+    def preroll_hovered(self, list_item):
+        self.preroll_timeout = None
+        result = list_item.get_item()
+        if result is not None:
+            self.player.preroll(result.url)
+        return False
+        
+    def preroll_next_favorite(self):
+        index = self.radio_selection.get_selected()
+        if index != Gtk.INVALID_LIST_POSITION and index + 1 < self.filter_model_radio.get_n_items():
+            self.player.preroll(self.filter_model_radio.get_item(index + 1).url)
+        
+    def release_radio_selection(self):
+        ### a favorite clicked next time plays again
+        self.playing_radio = None
+        self.radio_selection.unselect_all()
+        
+    def radio_selection_changed(self, selection, *args):
+        ### a click selects and plays, refiltering keeps the selection and the stream
+        if selection.get_selected_item() is not self.playing_radio:
+            self.play_radio()
+        
+    def play_radio(self, *args):
+        station = self.radio_selection.get_selected_item()
+        if station is None:
+            return
+        self.playing_radio = station
+        self.play_station(station.name, station.url)
+        self.preroll_next_favorite()
 
     def stop(self, button):
-        self.playbin.set_state(Gst.State.NULL)
-        self.stop_button.set_sensitive(False)
+        self.player.stop()
+        self.release_radio_selection()
+        
+    def update_tag_label(self, *args):
+        title = self.player.title
+        if title and not self.player.buffering:
+            self.tag_label.set_markup(f'<b><span foreground="#55aaff" size="x-large">{GLib.markup_escape_text(title)}</span></b>')
+        self.tag_label.set_tooltip_text("\n".join(self.player.info()) or None)
+        
+    def show_history(self, button):
+        HISTORY.query(limit=HISTORY_SHOWN).add_done_callback(lambda future: GLib.idle_add(self.on_history, future))
         
-    def on_tag(self, bus, msg):
-        if not msg == None:
-            taglist = msg.parse_tag()
-            if not taglist == None:
-                my_tag = f'{taglist.get_string(taglist.nth_tag_name(0)).value}'
-                if my_tag:
-                    if not self.old_tag == my_tag and not my_tag == "None":
-                        print(my_tag)
-                        self.tag_label.set_markup(f'<b><span foreground="#55aaff" size="x-large">{my_tag.replace("&", "&amp")}</span></b>')
-                        self.old_tag = my_tag
+    def on_history(self, future):
+        lines = []
+        for entry in future.result():
+            stamp = time.strftime("%d.%m. %H:%M", time.localtime(entry["time"]))
+            lines.append(f"{stamp}  {entry['station'] or ''}\n          {entry['title']}")
+        self.history_label.set_text("\n".join(lines) or "nothing played yet")
+        return False
 
     def find_stations(self, *args):
+        self.cancel_search()
+        self.search_params = None
         self.playlist = "#EXTM3U\n"
-        i = 0
-        self.model.clear()
+        self.playing_result = None
+        self.results.remove_all()
+        self.probe_rows = {}
+        PROBER.set_wanted(())
         mysearch = self.search_entry.get_text()
         if mysearch == "":
             self.tag_label.set_text("please enter search term")
             return
-        rb = RadioBrowser()
         if self.country_code.get_text() == "":
             print("country_code:", "None")
             myparams = {'name': 'search', 'nameExact': 'false'}
@@ -542,63 +882,291 @@ class FinderWindow(Gtk.ApplicationWindow):
                 if key == "name":
                     myparams[key] = mysearch
         
-        r = rb.station_search(params=myparams)
-        
-        n = ""
-        m = ""
-        for i in range(len(r)):
-            for key,value in r[i].items():
-                if str(key) == "name":
-                    n = value.replace(",", " ")
-                if str(key) == "url":
-                    m = value
-                    icon_image = GdkPixbuf.Pixbuf.new_from_file("icon.png").scale_simple(20, 20, GdkPixbuf.InterpType.NEAREST)
-                    self.model.append((n, m, icon_image))
-                    self.playlist += f"#EXTINF:{i+1},{n}\n{m}\n"
-
-        self.tag_label.set_text(f"found {len(r)} stations that contains '{mysearch}'")
-        self.scroll.get_vadjustment().set_value(0)
-                    
-    def getURLfromPLS(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("pls detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
-        else:
-           print("no urls found") 
-    
-    def getURLfromM3U(self, inURL):
-        headers = {
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-                    }
-        print("m3u detecting", inURL)
-        url = ""
-        if "&" in inURL:
-            inURL = inURL.partition("&")[0]
-        response = requests.get(inURL, headers = headers)
-        if "http" in response.text:
-            html = response.text.splitlines()
-            for line in html:
-                if "http" in line:
-                    url = f'http{line.split("http")[1]}'
-                    break
-            print(url)
-            return (url)
+        self.search_text = mysearch
+        self.search_params = myparams
+        self.search_offset = 0
+        self.search_exhausted = False
+        self.search_results = []
+        
+        superset = self.filter_superset(myparams)
+        if superset is not None:
+            ### before the rows go in, a scroll they cause must not start the search again
+            self.search_exhausted = True
+            self.append_stations(superset)
+            self.tag_label.set_text(f"found {len(superset)} stations that contains '{mysearch}'")
+            return
+        self.load_page()
+        
+    def live_search(self, entry):
+        ### search-changed is already debounced by the entry's search delay
+        if entry.get_text() == self.control_query:
+            ### the control socket started this search already
+            self.control_query = None
+            return
+        if self.search_params is not None and self.search_params["name"] == entry.get_text() \
+           and self.search_params.get("countrycode", "") == self.country_code.get_text():
+            ### Enter searched for this text before the delay was over
+            return
+        self.cancel_search()
+        if LIVE_SEARCH and len(entry.get_text().strip()) >= LIVE_SEARCH_MIN_CHARS:
+            self.find_stations()
+            
+    @staticmethod
+    def superset_key(myparams):
+        return sorted((key, str(value).lower()) for key, value in myparams.items() if key not in ("name", "limit", "offset"))
+        
+    def filter_superset(self, myparams):
+        ### a query containing an earlier complete query is answered by filtering its results
+        if self.search_superset is None:
+            return None
+        key, name, stations = self.search_superset
+        query = myparams["name"].lower()
+        if key != self.superset_key(myparams) or name not in query:
+            return None
+        return [station for station in stations if query in (station.get("name") or "").lower()]
+        
+    def on_scroll_changed(self, adjustment):
+        self.load_more(adjustment)
+        self.schedule_thumbnails()
+        
+    def load_more(self, adjustment):
+        ### less than two screens left, fetch the next page
+        if adjustment.get_value() + 2 * adjustment.get_page_size() >= adjustment.get_upper():
+            self.load_page()
+        
+    def schedule_thumbnails(self):
+        if self.thumbnail_timeout is None:
+            self.thumbnail_timeout = GLib.timeout_add(THUMBNAIL_DELAY, self.update_thumbnails)
+            
+    def visible_results(self):
+        ### the grid binds the visible items and a few around them
+        return list(self.shown_results)
+        
+    def update_thumbnails(self):
+        ### show cached favicons of the visible results, fetch the missing ones
+        self.thumbnail_timeout = None
+        wanted = set()
+        visible = self.visible_results()
+        for result in visible:
+            if not result.favicon:
+                continue
+            if THUMBNAILS.get(result.favicon) is None:
+                wanted.add(result.favicon)
+                continue
+            pixbuf = self.result_icon(result)
+            if result.icon != pixbuf:
+                result.icon = pixbuf
+        THUMBNAILS.set_wanted(wanted)
+        for url in wanted:
+            THUMBNAILS.request(url, self.on_thumbnail)
+        if PRERESOLVE:
+            RESOLVER.prefetch(result.url for result in visible)
+        return False
+        
+    def on_thumbnail(self, url, pixbuf):
+        for result in self.visible_results():
+            if result.favicon == url:
+                result.icon = self.result_icon(result)
+                
+    @staticmethod
+    def result_icon(result):
+        pixbuf = THUMBNAILS.get(result.favicon) if result.favicon else None
+        if pixbuf is None:
+            pixbuf = load_icon("icon.png")
+        return dim_icon(pixbuf) if result.state == radiocore.prober.STREAM_DEAD else pixbuf
+        
+    def probe_result(self, result):
+        ### the result waits for the prober, one probe serves every result with this url
+        self.probe_rows.setdefault(result.url, []).append(result)
+        if len(self.probe_rows[result.url]) == 1:
+            PROBER.request(result.url, self.on_probed)
+        
+    def on_probed(self, url, state, info):
+        for result in self.probe_rows.pop(url, []):
+            result.state = state
+            result.info = info
+            result.icon = self.result_icon(result)
+        if state == radiocore.prober.STREAM_DEAD:
+            self.schedule_sort()
+            
+    def schedule_sort(self, *args):
+        if self.sort_timeout is None and self.dead_last_button.get_active():
+            self.sort_timeout = GLib.timeout_add(PROBE_SORT_DELAY, self.sort_dead_last)
+            
+    def sort_dead_last(self):
+        ### stable, the order of the search results stays among the living and the dead
+        self.sort_timeout = None
+        if not self.dead_last_button.get_active():
+            return False
+        results = list(self.results)
+        order = sorted(results, key=lambda result: result.state == radiocore.prober.STREAM_DEAD)
+        if order == results:
+            return False
+        selected = self.results_selection.get_selected_item()
+        self.results.splice(0, len(results), order)
+        if selected is not None:
+            self.results_selection.set_selected(order.index(selected))
+        return False
+        
+    def load_page(self):
+        if self.search_params is None or self.search_exhausted or self.search_future is not None:
+            return
+        if self.search_offset >= SEARCH_MAX_ROWS:
+            return
+        mysearch = self.search_text
+        myparams = dict(self.search_params, limit=SEARCH_PAGE_SIZE, offset=self.search_offset)
+        if self.offline_button.get_active() and STATIONS.count():
+            self.append_page(STATIONS.search(myparams), mysearch)
+            return
+        cached = SEARCH_CACHE.get(myparams)
+        if cached is not None:
+            self.append_page(cached, mysearch)
+            return
+        
+        ### run the request in the pool, never on the main loop
+        generation = self.search_generation
+        if self.search_offset == 0:
+            self.tag_label.set_text(f"searching '{mysearch}' ...")
+        self.search_future = SEARCH_POOL.submit(self.stream_search, radiocore.browser.RadioBrowser(), myparams, generation)
+        self.search_future.add_done_callback(
+            lambda future: GLib.idle_add(self.on_search_done, future, generation, mysearch, myparams))
+        
+    def stream_search(self, rb, myparams, generation):
+        ### runs in the pool, rows go to the model in batches while the response downloads
+        count = 0
+        batch = []
+        stations = rb.station_search_iter(myparams, on_response=lambda resp: self.track_response(resp, generation))
+        try:
+            for station in stations:
+                if generation != self.search_generation:
+                    return None
+                batch.append(station)
+                if len(batch) == SEARCH_BATCH_SIZE:
+                    GLib.idle_add(self.append_stations, batch, generation)
+                    count += len(batch)
+                    batch = []
+        finally:
+            stations.close()
+        if batch:
+            GLib.idle_add(self.append_stations, batch, generation)
+            count += len(batch)
+        return count
+        
+    def track_response(self, resp, generation):
+        ### runs in the pool, cancel_search aborts the download of a replaced search
+        with self.search_lock:
+            if generation == self.search_generation:
+                self.search_response = resp
+                return
+        radiocore.client.abort_response(resp)
+        
+    def disable_offline(self):
+        self.offline_button.set_active(False)
+        self.offline_button.set_sensitive(False)
+        self.offline_button.set_tooltip_text("the offline station database needs SQLite 3.34 or newer with fts5")
+        return False
+        
+    def offline_toggled(self, button):
+        if not button.get_active():
+            return
+        if not STATIONS.supported():
+            self.disable_offline()
+            return
+        if not STATIONS.count():
+            self.tag_label.set_text("downloading the station database ...")
+        if STATIONS.needs_sync():
+            STATIONS.sync_in_background(lambda error: GLib.idle_add(self.on_sync_done, error))
+            
+    def on_sync_done(self, error):
+        if error is not None:
+            self.tag_label.set_text("station database update failed")
         else:
-           print("no urls found") 
+            self.tag_label.set_text(f"station database: {STATIONS.count()} stations")
+        return False
+        
+    def cancel_search(self, *args):
+        ### results of older searches are dropped when they arrive
+        with self.search_lock:
+            self.search_generation += 1
+            resp, self.search_response = self.search_response, None
+        if resp is not None:
+            ### the worker stops at once instead of reading the rest of the old answer
+            radiocore.client.abort_response(resp)
+        self.finish_search_waiters(RuntimeError("replaced by a newer search"))
+        if self.search_future is not None:
+            self.search_future.cancel()
+            self.search_future = None
+            
+    def on_search_done(self, future, generation, mysearch, myparams):
+        if generation != self.search_generation or future.cancelled():
+            return False
+        self.search_future = None
+        with self.search_lock:
+            self.search_response = None
+        try:
+            count = future.result()
+        except Exception as e:
+            print("search failed:", e)
+            if STATIONS.count():
+                ### no network, answer from the offline database
+                self.append_page(STATIONS.search(myparams), mysearch)
+                return False
+            self.search_exhausted = True
+            self.tag_label.set_text(f"search for '{mysearch}' failed")
+            self.finish_search_waiters(e)
+            return False
+        self.page_counted(count, mysearch)
+        self.page_done(mysearch)
+        return False
         
+    def append_stations(self, r, generation=None):
+        if generation is not None and generation != self.search_generation:
+            return False
+        count = len(self.results)
+        first = count == 0
+        self.search_results.extend(r)
+        icon_image = load_icon("icon.png")
+        PROBER.want(station.get("url") or "" for station in r)
+        results = []
+        for station in r:
+            n = (station.get("name") or "").replace(",", " ")
+            m = station.get("url") or ""
+            ### a cached verdict is shown at once
+            state, info = PROBER.verdict(m) or (radiocore.prober.STREAM_UNKNOWN, "")
+            icon = dim_icon(icon_image) if state == radiocore.prober.STREAM_DEAD else icon_image
+            result = SearchResult(n, m, icon, station.get("favicon") or "", state, info)
+            results.append(result)
+            if state == radiocore.prober.STREAM_UNKNOWN and PROBE_STREAMS and m:
+                self.probe_result(result)
+            self.playlist += f"#EXTINF:{count + len(results)},{n}\n{m}\n"
+        self.results.splice(count, 0, results)
+        if generation is not None:
+            self.tag_label.set_text(f"found {len(self.results)} stations so far ...")
+        if first:
+            self.scroll.get_vadjustment().set_value(0)
+        self.schedule_thumbnails()
+        self.schedule_sort()
+        return False
+        
+    def append_page(self, r, mysearch):
+        ### counted before the rows go in, scrolling to the top may already ask for the next page
+        self.page_counted(len(r), mysearch)
+        self.append_stations(r)
+        self.page_done(mysearch)
+        
+    def page_counted(self, count, mysearch):
+        self.search_offset += count
+        self.search_exhausted = count < SEARCH_PAGE_SIZE
+        if self.search_exhausted:
+            self.search_superset = (self.superset_key(self.search_params), mysearch.lower(), self.search_results)
+            
+    def page_done(self, mysearch):
+        self.finish_search_waiters()
+        if self.search_exhausted or self.search_offset >= SEARCH_MAX_ROWS:
+            self.tag_label.set_text(f"found {len(self.results)} stations that contains '{mysearch}'")
+        else:
+            self.tag_label.set_text(f"found {len(self.results)} stations that contains '{mysearch}', scroll down for more")
+                    
     def save_playlist(self, *args):
         if self.playlist == "" or self.playlist == "#EXTM3U\n":
             return
@@ -621,6 +1189,54 @@ class FinderWindow(Gtk.ApplicationWindow):
             filename = str(dialog.get_file().get_path())
             with open(filename, 'w') as f:
                 f.write(self.playlist)
+                
+    def playlist_filter(self):
+        filter = Gtk.FileFilter()
+        filter.set_name("Playlists")
+        filter.add_pattern("*.m3u")
+        filter.add_pattern("*.m3u8")
+        filter.add_pattern("*.pls")
+        return filter
+                
+    def import_favorites(self, *args):
+        self.dialog = Gtk.FileChooserNative.new("Import", self, Gtk.FileChooserAction.OPEN, "Import", "Cancel")
+        self.dialog.add_filter(self.playlist_filter())
+        self.dialog.set_transient_for(self)
+        self.dialog.connect("response", self.on_import_response)
+        self.dialog.show()
+        
+    def on_import_response(self, dialog, response_id):
+        if response_id != Gtk.ResponseType.ACCEPT:
+            return
+        filename = str(dialog.get_file().get_path())
+        try:
+            added = FAVORITES.import_playlist(read_playlist(filename))
+        except OSError as e:
+            self.tag_label.set_text(f"import failed: {e}")
+            return
+        icon_image = load_icon("icon_fav.png")
+        self.radio_model.splice(self.radio_model.get_n_items(), 0, 
+                                [Station(name, url, icon_image) for name, url in added])
+        self.tag_label.set_text(f"{len(added)} stations imported")
+        
+    def export_favorites(self, *args):
+        self.dialog = Gtk.FileChooserNative.new("Export", self, Gtk.FileChooserAction.SAVE, "Export", "Cancel")
+        self.dialog.add_filter(self.playlist_filter())
+        self.dialog.set_current_name("Favorites.m3u")
+        self.dialog.set_transient_for(self)
+        self.dialog.connect("response", self.on_export_response)
+        self.dialog.show()
+        
+    def on_export_response(self, dialog, response_id):
+        if response_id != Gtk.ResponseType.ACCEPT:
+            return
+        filename = str(dialog.get_file().get_path())
+        try:
+            FAVORITES.export_playlist(filename)
+        except OSError as e:
+            self.tag_label.set_text(f"export failed: {e}")
+            return
+        self.tag_label.set_text(f"{len(FAVORITES)} stations exported")
                     
 class MyApp(Adw.Application):
     def __init__(self, **kwargs):
@@ -628,12 +1244,21 @@ class MyApp(Adw.Application):
         self.connect("activate", self.on_activate)
         self.connect("open", self.on_activate)
         self.set_flags(Gio.ApplicationFlags.HANDLES_OPEN)
+        self.connect("shutdown", self.on_shutdown)
         self.win = None
         
     def on_activate(self, app, *args, **kwargs):
         self.win = FinderWindow(application=app)
+        startup.report_first_frame(self.win, self.quit)
         self.win.present()
         
+    def on_shutdown(self, app):
+        if PROBER.loaded():
+            PROBER.save()
+        FAVORITES.close()
+        if self.win is not None:
+            self.win.control.close()
+        
            
 app = MyApp()
 sm = app.get_style_manager()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### time to first frame of every window, from starting the interpreter to the first painted frame
+### python3 benchmarks/startup.py [script ...], exits with 1 when a window misses the budget
+### without a display the windows run in Xvfb, without Xvfb it exits with SKIPPED
+
+import os
+import shutil
+import sys
+import statistics
+import subprocess
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from radiocore.startup import BENCHMARK_ENV, FIRST_FRAME
+
+SCRIPTS = ("RadioApp.py", "RadioApp4.py", "RadioFinderApp.py", "RadioFinderApp4.py", "RadioFinderApp4D.py")
+BUDGET = 0.200 # seconds from spawn to the first frame
+RUNS = 5 # the median counts, one more run before them fills the disk cache
+TIMEOUT = 20 # seconds, a window that never paints fails
+SKIPPED = 77 # exit status when nothing could be measured, a CI job does not pass by accident
+XVFB_SCREEN = "1280x800x24"
+
+def first_frame(script):
+    env = dict(os.environ, **{BENCHMARK_ENV: "1"})
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, script)], cwd=ROOT, env=env,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True)
+    ### a window that hangs is killed, that ends its stdout
+    timer = threading.Timer(TIMEOUT, process.kill)
+    timer.start()
+    try:
+        for line in process.stdout:
+            if line.strip() == FIRST_FRAME:
+                return time.perf_counter() - start
+        return None
+    finally:
+        timer.cancel()
+        process.kill()
+        process.wait()
+
+def measure(script):
+    first_frame(script)
+    times = [first_frame(script) for run in range(RUNS)]
+    if None in times:
+        return None
+    return statistics.median(times)
+
+### a headless runner measures in a virtual X server, it reports its display number when ready
+def start_xvfb():
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen([xvfb, "-displayfd", str(write_fd), "-nolisten", "tcp", "-screen", "0", XVFB_SCREEN],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               pass_fds=(write_fd,))
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        number = f.readline().strip()
+    if not number:
+        process.kill()
+        process.wait()
+        return None
+    os.environ.update(DISPLAY=f":{number}", GDK_BACKEND="x11")
+    return process
+
+def main(scripts):
+    xvfb = None
+    if not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        xvfb = start_xvfb()
+        if xvfb is None:
+            print("no display and no Xvfb, startup benchmark skipped")
+            return SKIPPED
+    try:
+        return measure_all(scripts)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+def measure_all(scripts):
+    failed = 0
+    for script in scripts or SCRIPTS:
+        seconds = measure(script)
+        if seconds is None:
+            print(f"{script:22} no first frame")
+            failed = 1
+            continue
+        verdict = "ok" if seconds <= BUDGET else "over budget"
+        print(f"{script:22} {seconds * 1000:6.0f} ms  {verdict}")
+        if seconds > BUDGET:
+            failed = 1
+    return failed
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
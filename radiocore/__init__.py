@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### the parts all radio front ends share, every submodule is only imported on first use
+### so a player-only app never loads requests or the search stack
+
+import importlib
+import sys
+
+SUBMODULES = ("browser", "client", "control", "favorites", "files", "icons", "metadata", "player",
+              "playlists", "prober", "resolver", "search", "startup", "stationdb")
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+### stands in for a module level object like STATIONS, its module is imported on first use
+class LazyObject:
+    def __init__(self, module, name):
+        self._module = f"{__name__}.{module}"
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(getattr(importlib.import_module(self._module), self._name), attr)
+
+    def loaded(self):
+        return self._module in sys.modules
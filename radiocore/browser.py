@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### radio-browser.info api, mirror selection and the search cache
+
+import atexit
+import json
+import codecs
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from radiocore.client import CLIENT
+from radiocore.files import write_atomic
+
+SERVER_CACHE = "servers.json"
+SERVER_CACHE_TTL = 24 * 60 * 60 # seconds
+SERVER_RETRY_DELAY = 60 * 60 # seconds after a failed discovery, the default hosts serve meanwhile
+DEFAULT_HOSTS = [
+    "https://de1.api.radio-browser.info",
+    "https://nl1.api.radio-browser.info",
+    "https://de2.api.radio-browser.info",
+]
+
+def get_radiobrowser_base_urls():
+    ### Get all base urls of all currently available radiobrowser servers
+    hosts = []
+    ips = socket.getaddrinfo('all.api.radio-browser.info',
+                             80, 0, 0, socket.IPPROTO_TCP)
+    for ip_tupple in ips:
+        ip = ip_tupple[4][0]
+        try:
+            host_addr = socket.gethostbyaddr(ip)
+        except OSError:
+            continue
+        if host_addr[0] not in hosts:
+            hosts.append(host_addr[0])
+
+    hosts.sort()
+    return list(map(lambda x: "https://" + x, hosts))
+    
+def read_server_cache():
+    try:
+        with open(SERVER_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+        
+def write_server_cache(hosts):
+    write_atomic(SERVER_CACHE, json.dumps({"time": time.time(), "hosts": hosts}))
+    
+def refresh_servers():
+    ### runs in a background thread, keeps the old server list on failure
+    global discovery_time
+    try:
+        hosts = get_radiobrowser_base_urls()
+    except OSError as e:
+        print("server discovery failed:", e)
+        hosts = []
+    if not hosts:
+        discovery_time = time.time() - SERVER_CACHE_TTL + SERVER_RETRY_DELAY
+        return
+    write_server_cache(hosts)
+    MIRRORS.set_hosts(hosts)
+    print("servers:", ", ".join(hosts))
+        
+discovery_thread = None
+discovery_time = None # last attempt, the cache file is only read once
+
+def discover_servers():
+    ### start a refresh if the cached server list is missing or older than the TTL
+    global discovery_thread, discovery_time
+    if discovery_thread is not None and discovery_thread.is_alive():
+        return
+    if discovery_time is None:
+        discovery_time = read_server_cache().get("time", 0)
+    if time.time() - discovery_time < SERVER_CACHE_TTL:
+        return
+    discovery_time = time.time()
+    discovery_thread = threading.Thread(target=refresh_servers, daemon=True)
+    discovery_thread.start()
+
+### get working urls at https://api.radio-browser.info/examples/serverlist_python3.py
+### https://de1.api.radio-browser.info/
+### https://nl1.api.radio-browser.info/
+### https://de2.api.radio-browser.info/
+
+### rank mirrors by measured latency, route requests to the fastest healthy one
+RANK_INTERVAL = 10 * 60 # seconds between two rankings
+PROBE_TIMEOUT = 3 # seconds
+FAILURE_BACKOFF = 60 # seconds a failed mirror is skipped
+
+class MirrorSelector:
+    def __init__(self, hosts):
+        self.lock = threading.Lock()
+        self.hosts = list(hosts)
+        self.ranking = list(hosts)
+        self.latencies = {}
+        self.failed = {}
+        self.ranked_at = 0
+        self.rank_thread = None
+        
+    def set_hosts(self, hosts):
+        with self.lock:
+            self.hosts = list(hosts)
+            known = [host for host in self.ranking if host in hosts]
+            self.ranking = known + [host for host in hosts if host not in known]
+            self.ranked_at = 0
+            
+    def probe(self, host):
+        start = time.monotonic()
+        try:
+            resp = CLIENT.get(f"{host}/json/stats", timeout=PROBE_TIMEOUT)
+            resp.raise_for_status()
+        except requests.RequestException:
+            return None
+        return time.monotonic() - start
+        
+    def rank(self):
+        ### probe all mirrors concurrently, fastest first, dead ones last
+        hosts = list(self.hosts)
+        if not hosts:
+            return
+        with ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+            latencies = dict(zip(hosts, pool.map(self.probe, hosts)))
+        alive = sorted([host for host in hosts if latencies[host] is not None], key=latencies.get)
+        dead = [host for host in hosts if latencies[host] is None]
+        now = time.time()
+        with self.lock:
+            self.ranking = alive + dead
+            self.latencies = latencies
+            self.failed = {host: now for host in dead}
+            self.ranked_at = now
+        for host in alive:
+            print(f"mirror {host}: {latencies[host] * 1000:.0f} ms")
+        
+    def rank_in_background(self):
+        if self.rank_thread is not None and self.rank_thread.is_alive():
+            return
+        if time.time() - self.ranked_at < RANK_INTERVAL:
+            return
+        self.rank_thread = threading.Thread(target=self.rank, daemon=True)
+        self.rank_thread.start()
+            
+    def candidates(self):
+        ### healthy mirrors in ranking order, recently failed ones as last resort
+        self.rank_in_background()
+        now = time.time()
+        with self.lock:
+            healthy = [host for host in self.ranking if now - self.failed.get(host, 0) > FAILURE_BACKOFF]
+            return healthy + [host for host in self.ranking if host not in healthy]
+            
+    def report_failure(self, host):
+        print(f"mirror {host} failed")
+        with self.lock:
+            self.failed[host] = time.time()
+            
+    def report_success(self, host):
+        if host in self.failed:
+            with self.lock:
+                self.failed.pop(host, None)
+
+### start from the last known servers, no network access at import
+MIRRORS = MirrorSelector(read_server_cache().get("hosts") or DEFAULT_HOSTS)
+
+### identical searches are answered from memory, optionally persisted between runs
+SEARCH_CACHE_FILE = "search_cache.json" # None keeps the cache in memory only
+SEARCH_CACHE_TTL = 60 * 60 # seconds
+SEARCH_CACHE_SIZE = 100 # searches
+
+class SearchCache:
+    def __init__(self, path=SEARCH_CACHE_FILE, ttl=SEARCH_CACHE_TTL, size=SEARCH_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.changed = False
+        self.load()
+        
+    @staticmethod
+    def make_key(params):
+        return json.dumps({key: str(value).strip().lower() for key, value in params.items()}, sort_keys=True)
+        
+    def get(self, params):
+        key = self.make_key(params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+            
+    def put(self, params, result):
+        key = self.make_key(params)
+        with self.lock:
+            self.entries[key] = (time.time(), result)
+            self.entries.move_to_end(key)
+            self.changed = True
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, stamp, result in entries[-self.size:]:
+            if now - stamp < self.ttl:
+                self.entries[key] = (stamp, result)
+                
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            entries = [[key, stamp, result] for key, (stamp, result) in self.entries.items()]
+        write_atomic(self.path, json.dumps(entries))
+        
+    ### every front end that searched keeps its answers for the next start
+    def save_at_exit(self):
+        if not self.changed:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            print("search cache not saved:", e)
+        
+SEARCH_CACHE = SearchCache()
+atexit.register(SEARCH_CACHE.save_at_exit)
+
+endpoints = {
+    "countries": {1: "{fmt}/countries", 2: "{fmt}/countries/{filter}"},
+    "codecs": {1: "{fmt}/codecs", 2: "{fmt}/codecs/{filter}"},
+    "states": {
+        1: "{fmt}/states",
+        2: "{fmt}/states/{filter}",
+        3: "{fmt}/states/{country}/{filter}",
+    },
+    "languages": {1: "{fmt}/languages", 2: "{fmt}/languages/{filter}"},
+    "tags": {1: "{fmt}/tags", 2: "{fmt}/tags/{filter}"},
+    "stations": {1: "{fmt}/stations", 3: "{fmt}/stations/{by}/{search_term}"},
+    "playable_station": {3: "{ver}/{fmt}/url/{station_id}"},
+    "station_search": {1: "{fmt}/stations/search"},
+    "stations_changed": {1: "{fmt}/stations/changed"},
+}
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+def iter_json_array(resp):
+    ### yield the items of a top level JSON array while the body is still downloading
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    try:
+        for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            buffer += utf8.decode(chunk)
+            pos = 0
+            if not started:
+                pos = len(buffer) - len(buffer.lstrip())
+                if pos == len(buffer):
+                    continue
+                if buffer[pos] != "[":
+                    raise ValueError("response is not a JSON array")
+                pos += 1
+                started = True
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    return
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    ### item not complete yet, wait for the next chunk
+                    break
+                yield item
+            buffer = buffer[pos:]
+    finally:
+        resp.close()
+    ### only the closing ] returns, a body that ends before it lost items
+    raise ValueError("truncated JSON array")
+
+def request(endpoint, **kwargs):
+
+    fmt = kwargs.get("format", "json")
+
+    if fmt == "xml":
+        content_type = f"application/{fmt}"
+    else:
+        content_type = f"application/{fmt}"
+
+    headers = {"content-type": content_type, "User-Agent": "getRadiolist/1.0"}
+
+    params = kwargs.get("params", {})
+    
+    stream = kwargs.get("stream", False)
+    ### on_response(resp) gets a streamed response before its body is read, to abort it
+    on_response = kwargs.get("on_response")
+
+    discover_servers()
+    error = None
+    for host in MIRRORS.candidates():
+        url = f"{host}/{endpoint}"
+        try:
+            resp = CLIENT.get(url, headers=headers, params=params, stream=stream)
+            if resp.status_code >= 500:
+                resp.raise_for_status()
+        except requests.RequestException as e:
+            ### try the next mirror
+            MIRRORS.report_failure(host)
+            error = e
+            continue
+        MIRRORS.report_success(host)
+        break
+    else:
+        raise error or requests.ConnectionError("no radio-browser mirror available")
+
+    if resp.status_code == 200:
+        if fmt == "xml":
+            return resp.text
+        if stream:
+            if on_response is not None:
+                on_response(resp)
+            return iter_json_array(resp)
+        return resp.json()
+
+    return resp.raise_for_status()
+
+
+class EndPointBuilder:
+    def __init__(self, fmt="json"):
+        self.fmt = fmt
+        self._option = None
+        self._endpoint = None
+
+    @property
+    def endpoint(self):
+        return endpoints[self._endpoint][self._option]
+
+    def produce_endpoint(self, **parts):
+        self._option = len(parts)
+        self._endpoint = parts["endpoint"]
+        parts.update({"fmt": self.fmt})
+        return self.endpoint.format(**parts)
+        
+class RadioBrowser:
+    def __init__(self, fmt="json"):
+        self.fmt = fmt
+        self.builder = EndPointBuilder(fmt=self.fmt)
+
+    def stations(self, **params):
+        endpoint = self.builder.produce_endpoint(endpoint="stations")
+        kwargs = {}
+        if params:
+            kwargs.update({"params": params})
+        return request(endpoint, **kwargs)
+
+    def stations_changed(self, **params):
+        endpoint = self.builder.produce_endpoint(endpoint="stations_changed")
+        kwargs = {}
+        if params:
+            kwargs.update({"params": params})
+        return request(endpoint, **kwargs)
+
+    def stations_byname(self, name):
+        endpoint = self.builder.produce_endpoint(
+            endpoint="stations", by="byname", search_term=name
+        )
+        return request(endpoint)
+
+    def station_search(self, params, **kwargs):
+        assert isinstance(params, dict), "params must be a dictionary."
+        cached = SEARCH_CACHE.get(params)
+        if cached is not None:
+            return cached
+        kwargs["params"] = params
+        endpoint = self.builder.produce_endpoint(endpoint="station_search")
+        result = request(endpoint, **kwargs)
+        SEARCH_CACHE.put(params, result)
+        return result
+        
+    def station_search_iter(self, params, **kwargs):
+        ### like station_search, but yields the stations while they arrive
+        assert isinstance(params, dict), "params must be a dictionary."
+        cached = SEARCH_CACHE.get(params)
+        if cached is not None:
+            yield from cached
+            return
+        kwargs["params"] = params
+        kwargs["stream"] = True
+        endpoint = self.builder.produce_endpoint(endpoint="station_search")
+        result = []
+        stations = request(endpoint, **kwargs)
+        try:
+            for station in stations:
+                result.append(station)
+                yield station
+        finally:
+            stations.close()
+        SEARCH_CACHE.put(params, result)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### shared keep-alive session, repeated requests reuse warm connections
+
+import socket
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 10
+TIMEOUT = (5, 20) # connect, read
+
+class HTTPClient:
+    def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+        
+### close() alone does not wake a thread blocked reading the body, shutting the socket down does
+def abort_response(resp):
+    sock = getattr(getattr(resp.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    resp.close()
+        
+CLIENT = HTTPClient()
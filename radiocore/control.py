@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### local control socket, one json object per line in both directions
+### request {"cmd": "play", "args": [3], "id": 1} -> reply {"id": 1, "ok": true, "result": ...}
+### a json array of requests is one batch, it gets one array of replies in the same order
+### after {"cmd": "subscribe"} the connection also receives {"event": "title", "data": ...}
+
+import json
+import os
+import socket
+import tempfile
+from concurrent.futures import Future
+from gi.repository import GLib
+
+CONTROL_DIR = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+CONTROL_APP = "radiodaemon" # the windows use "radiofinder" and "radioplayer"
+CONTROL_TIMEOUT = 30 # seconds a client waits, a search may take that long
+CONTROL_MAX_LINE = 64 * 1024 # bytes, a longer request closes the connection
+CONTROL_CHUNK_SIZE = 16 * 1024
+
+def socket_path(app=CONTROL_APP):
+    return os.path.join(CONTROL_DIR, f"{app}-{os.getuid()}.sock")
+
+def is_running(path=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path or socket_path())
+        except OSError:
+            return False
+    return True
+
+def read_lines(sock):
+    data = b""
+    while True:
+        chunk = sock.recv(CONTROL_CHUNK_SIZE)
+        if not chunk:
+            raise ConnectionError("control socket closed")
+        data += chunk
+        while b"\n" in data:
+            line, _, data = data.partition(b"\n")
+            yield json.loads(line)
+
+def send(request, path=None, timeout=CONTROL_TIMEOUT):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode())
+        return next(read_lines(sock))
+
+def call(cmd, *args, path=None, timeout=CONTROL_TIMEOUT):
+    return send({"cmd": cmd, "args": list(args)}, path, timeout)
+
+### commands are (cmd, arg, ...) sequences, all of them travel in one round trip
+def call_batch(commands, path=None, timeout=CONTROL_TIMEOUT):
+    return send([{"cmd": cmd, "args": list(args)} for cmd, *args in commands], path, timeout)
+
+def listen(path=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path or socket_path())
+        sock.sendall(b'{"cmd": "subscribe"}\n')
+        for message in read_lines(sock):
+            if "event" in message:
+                yield message["event"], message.get("data")
+
+### favorites and search results are counted from 1, as they are shown
+def pick(stations, number, what):
+    index = int(number) - 1
+    if not 0 <= index < len(stations):
+        raise IndexError(f"no {what} {number}, there are {len(stations)}")
+    return stations[index]
+    
+### volume in percent, get and set use 0.0 - 1.0 like the sliders
+def volume(get, set, value=None):
+    if value is not None:
+        set(min(100, max(0, int(value))) / 100)
+    return round(get() * 100)
+    
+### toggle() flips the mute the way the window's mute button does
+def mute(player, toggle, state=None):
+    if state is None or flag(state) != player.get_mute():
+        toggle()
+    return player.get_mute()
+    
+### command line arguments arrive as strings
+def flag(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "on", "true", "yes")
+    return bool(value)
+
+def player_status(player):
+    return {"station": player.name if player.is_playing() else None,
+            "url": player.url,
+            "title": player.title,
+            "volume": round(player.volume * 100),
+            "muted": player.get_mute()}
+
+### the player's signals go out as events to every subscribed connection
+def publish_player(server, player):
+    player.connect("title-changed", lambda player, title: server.publish("title", {"station": player.name, "title": title}))
+    player.connect("status", lambda player, text: server.publish("status", text))
+    player.connect("state-changed", lambda player, playing: server.publish("state", player_status(player)))
+
+class ControlConnection:
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.inbox = b""
+        self.outbox = b""
+        self.subscribed = False
+        self.out_id = None
+        self.in_id = GLib.io_add_watch(sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                       GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_readable)
+
+    def on_readable(self, fd, condition):
+        try:
+            data = self.sock.recv(CONTROL_CHUNK_SIZE)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+        if not data:
+            self.close()
+            return False
+        self.inbox += data
+        while b"\n" in self.inbox and self.sock is not None:
+            line, _, self.inbox = self.inbox.partition(b"\n")
+            if line.strip():
+                self.server.handle(self, line)
+        if len(self.inbox) > CONTROL_MAX_LINE:
+            self.close()
+            return False
+        return self.sock is not None
+
+    def send(self, message):
+        if self.sock is None:
+            return
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode()
+        if not self.outbox:
+            ### most replies fit into the socket buffer and leave at once
+            try:
+                data = data[self.sock.send(data):]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self.close()
+                return
+        self.outbox += data
+        if self.outbox and self.out_id is None:
+            self.out_id = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_OUT, self.on_writable)
+
+    def on_writable(self, fd, condition):
+        ### a slow reader never blocks the main loop, the rest waits for the next IO_OUT
+        try:
+            sent = self.sock.send(self.outbox)
+        except BlockingIOError:
+            return True
+        except OSError:
+            self.out_id = None
+            self.close()
+            return False
+        self.outbox = self.outbox[sent:]
+        if self.outbox:
+            return True
+        self.out_id = None
+        return False
+
+    def close(self):
+        if self.sock is None:
+            return
+        for source in (self.in_id, self.out_id):
+            if source is not None:
+                GLib.source_remove(source)
+        self.in_id = self.out_id = None
+        self.sock.close()
+        self.sock = None
+        self.server.clients.discard(self)
+
+class ControlServer:
+    def __init__(self, commands, path=None):
+        ### name -> callable(*args), it returns the result or a Future that delivers it later
+        self.commands = commands
+        self.path = path or socket_path()
+        self.sock = None
+        self.accept_id = None
+        self.clients = set()
+
+    def start(self):
+        if os.path.exists(self.path):
+            if is_running(self.path):
+                raise OSError(f"{self.path} is in use, another player is running")
+            ### left over from a crash
+            os.unlink(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        ### created 0600, in the shared /tmp nobody else may connect in between
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        sock.listen()
+        sock.setblocking(False)
+        self.sock = sock
+        self.accept_id = GLib.io_add_watch(sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_accept)
+
+    def on_accept(self, fd, condition):
+        try:
+            client, address = self.sock.accept()
+        except BlockingIOError:
+            return True
+        client.setblocking(False)
+        self.clients.add(ControlConnection(self, client))
+        return True
+
+    def handle(self, connection, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            connection.send(self.message({}, error="not json"))
+            return
+        if not isinstance(request, list):
+            self.run(connection, request, connection.send)
+            return
+        replies = [None] * len(request)
+        waiting = [len(request)]
+        if not request:
+            connection.send(replies)
+            return
+        def done(index, reply):
+            replies[index] = reply
+            waiting[0] -= 1
+            if not waiting[0]:
+                connection.send(replies)
+        for index, item in enumerate(request):
+            self.run(connection, item, lambda reply, index=index: done(index, reply))
+
+    def run(self, connection, request, done):
+        try:
+            cmd = request["cmd"]
+            args = request.get("args", [])
+            if not isinstance(args, list):
+                raise TypeError
+        except (TypeError, KeyError, AttributeError):
+            done(self.message(request if isinstance(request, dict) else {}, error="expected {\"cmd\": ..., \"args\": [...]}"))
+            return
+        if cmd in ("subscribe", "unsubscribe"):
+            connection.subscribed = cmd == "subscribe"
+            done(self.message(request, connection.subscribed))
+            return
+        function = self.commands.get(cmd)
+        if function is None:
+            done(self.message(request, error=f"unknown command {cmd!r}"))
+            return
+        ### an error of one command is its reply, it never reaches the main loop's watch
+        try:
+            result = function(*args)
+        except Exception as e:
+            done(self.failure(request, cmd, e))
+            return
+        if isinstance(result, Future):
+            result.add_done_callback(lambda future: GLib.idle_add(self.finish, request, future, done))
+        else:
+            self.reply(request, result, done)
+
+    def finish(self, request, future, done):
+        try:
+            result = future.result()
+        except Exception as e:
+            done(self.failure(request, request["cmd"], e))
+        else:
+            self.reply(request, result, done)
+        return False
+
+    def reply(self, request, result, done):
+        try:
+            json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            done(self.failure(request, request["cmd"], e))
+            return
+        done(self.message(request, result))
+
+    def failure(self, request, cmd, error):
+        if not isinstance(error, (TypeError, ValueError, LookupError, OSError)):
+            print(f"control command {cmd} failed:", repr(error))
+        return self.message(request, error=str(error) or type(error).__name__)
+
+    def message(self, request, result=None, error=None):
+        message = {"ok": error is None}
+        if "id" in request:
+            message["id"] = request["id"]
+        if error is None:
+            message["result"] = result
+        else:
+            message["error"] = error
+        return message
+
+    def publish(self, event, data=None):
+        for client in list(self.clients):
+            if client.subscribed:
+                client.send({"event": event, "data": data})
+
+    def close(self):
+        for client in list(self.clients):
+            client.close()
+        if self.accept_id is not None:
+            GLib.source_remove(self.accept_id)
+            self.accept_id = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### favorites live in memory keyed by url, edits reach the disk in one delayed write
+
+import configparser
+import contextlib
+import fcntl
+import json
+import os
+from collections import OrderedDict
+from gi.repository import GLib
+from radiocore.files import write_atomic
+
+### m3u / pls files are read line by line, entries come out as (name, url)
+def read_playlist(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first = f.readline()
+        f.seek(0)
+        if first.strip().lower() == "[playlist]" or path.lower().endswith(".pls"):
+            ### titles may follow their files, only unmatched numbers are kept
+            files, titles = {}, {}
+            for line in f:
+                key, sep, value = line.strip().partition("=")
+                if not sep:
+                    continue
+                key = key.lower()
+                if key.startswith("file"):
+                    files[key[4:]] = value.strip()
+                elif key.startswith("title"):
+                    titles[key[5:]] = value.strip()
+                else:
+                    continue
+                number = key[4:] if key.startswith("file") else key[5:]
+                if number in files and number in titles:
+                    yield titles.pop(number), files.pop(number)
+            for number, url in files.items():
+                yield url, url
+        else:
+            name = ""
+            for line in f:
+                line = line.strip()
+                if line.upper().startswith("#EXTINF:"):
+                    name = line.partition(",")[2].strip()
+                elif line and not line.startswith("#"):
+                    yield name or line, line
+                    name = ""
+                    
+def playlist_lines(stations, pls=False):
+    if pls:
+        yield "[playlist]\n"
+        number = 0
+        for number, (name, url) in enumerate(stations, 1):
+            yield f"File{number}={url}\nTitle{number}={name}\nLength{number}=-1\n"
+        yield f"NumberOfEntries={number}\nVersion=2\n"
+    else:
+        yield "#EXTM3U\n"
+        for name, url in stations:
+            yield f"#EXTINF:-1,{name}\n{url}\n"
+        
+FAVORITES_FORMAT = "jsonl" # "ini" keeps the plain config_d file
+FAVORITES_FILE = "config_d"
+FAVORITES_LOG = "favorites.jsonl"
+FAVORITES_FLUSH_DELAY = 1000 # ms, edits within this window are written together
+FAVORITES_COMPACT_SLACK = 1000 # log lines beyond the favorites count before a rewrite
+FAVORITES_WATCH_INTERVAL = 2 # seconds between looks for edits of another process
+
+class IniFavorites:
+    def __init__(self, path=FAVORITES_FILE):
+        self.path = path
+        
+    def exists(self):
+        return os.path.exists(self.path)
+        
+    def load(self):
+        config = configparser.ConfigParser(strict=False)
+        try:
+            config.read(self.path)
+        except configparser.Error as e:
+            print("favorites not readable:", e)
+        for section in config.sections():
+            url = config.get(section, "url", raw=True, fallback="").strip()
+            if url:
+                yield url, section
+                
+    ### one window owns its ini file
+    def changed(self):
+        return False
+        
+    def locked(self):
+        return contextlib.nullcontext()
+        
+    def write(self, stations, changes):
+        write_atomic(self.path, "".join(f"[{name}]\nurl={url}\n" for url, name in stations.items()))
+        
+### every edit is one appended json line, the log is rewritten once it is mostly history
+### RadioFinderApp4D.py and RadioDaemon.py share the log, reads and writes hold its lock file
+class JournalFavorites:
+    def __init__(self, path=FAVORITES_LOG):
+        self.path = path
+        self.lines = 0
+        self.stamp = None # (inode, size, mtime) after our last read or write
+        self.lock_file = None
+        self.lock_depth = 0
+        
+    def exists(self):
+        return os.path.exists(self.path)
+        
+    @staticmethod
+    def file_stamp(st):
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+        
+    def changed(self):
+        try:
+            stamp = self.file_stamp(os.stat(self.path))
+        except OSError:
+            stamp = None
+        return stamp != self.stamp
+        
+    @contextlib.contextmanager
+    def locked(self):
+        ### the log itself is replaced on compaction, the lock lives in a file next to it
+        if self.lock_depth == 0:
+            self.lock_file = open(self.path + ".lock", 'a')
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.lock_depth += 1
+        try:
+            yield
+        finally:
+            self.lock_depth -= 1
+            if self.lock_depth == 0:
+                self.lock_file.close()
+                self.lock_file = None
+                
+    def load(self):
+        self.lines = 0
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            self.stamp = None
+            return
+        with f:
+            self.stamp = self.file_stamp(os.fstat(f.fileno()))
+            end = 0 # byte offset after the last complete line
+            torn = False
+            for line in f:
+                self.lines += 1
+                if line.endswith(b"\n"):
+                    end += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    ### a torn last line after a crash
+                    torn = True
+                    continue
+                torn = False
+                if "remove" in entry:
+                    yield entry["remove"], None
+                elif entry.get("url"):
+                    yield entry["url"], entry.get("name") or entry["url"]
+        if self.lines and not line.endswith(b"\n"):
+            self.repair_tail(end, torn)
+            
+    def repair_tail(self, end, torn):
+        ### the next append must start on a new line, or it merges with the last one and is lost too
+        try:
+            with open(self.path, 'r+b') as f:
+                if torn:
+                    f.truncate(end)
+                    self.lines -= 1
+                else:
+                    f.seek(0, os.SEEK_END)
+                    f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+                self.stamp = self.file_stamp(os.fstat(f.fileno()))
+        except OSError as e:
+            print("favorites log not repaired:", e)
+                    
+    @staticmethod
+    def entry(url, name):
+        if name is None:
+            return json.dumps({"remove": url}, ensure_ascii=False) + "\n"
+        return json.dumps({"name": name, "url": url}, ensure_ascii=False) + "\n"
+                    
+    def write(self, stations, changes):
+        if changes is None or self.lines + len(changes) > len(stations) + FAVORITES_COMPACT_SLACK:
+            write_atomic(self.path, (self.entry(url, name) for url, name in stations.items()))
+            self.lines = len(stations)
+            self.stamp = self.file_stamp(os.stat(self.path))
+            return
+        with open(self.path, 'a', encoding="utf-8") as f:
+            f.writelines(self.entry(url, name) for url, name in changes)
+            f.flush()
+            os.fsync(f.fileno())
+            self.stamp = self.file_stamp(os.fstat(f.fileno()))
+        self.lines += len(changes)
+
+class FavoritesStore:
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = JournalFavorites() if FAVORITES_FORMAT == "jsonl" else IniFavorites()
+        self.backend = backend
+        self._stations = None # url -> name
+        self.changes = [] # (url, name) since the last flush, name None for a removal
+        self.flush_id = None
+        self.watch_id = None
+        self.on_reload = None
+        
+    ### the file is read on first use, not while a window starts
+    @property
+    def stations(self):
+        if self._stations is None:
+            self.load()
+        else:
+            self.reload()
+        return self._stations
+        
+    def load(self):
+        self._stations = OrderedDict()
+        with self.backend.locked():
+            if not self.backend.exists() and not isinstance(self.backend, IniFavorites):
+                self.migrate(IniFavorites())
+                return
+            for url, name in self.backend.load():
+                self.apply(url, name)
+                
+    def apply(self, url, name):
+        if name is None:
+            self._stations.pop(url, None)
+        elif not url in self._stations:
+            self._stations[url] = name
+            
+    ### another process wrote the log, edits not flushed yet stay on top of its list
+    def reload(self):
+        if self._stations is None or not self.backend.changed():
+            return False
+        self.load()
+        for url, name in self.changes:
+            self.apply(url, name)
+        print(f"favorites reloaded, {len(self._stations)} stations")
+        if self.on_reload is not None:
+            self.on_reload()
+        return True
+        
+    ### a window refreshes its list when the daemon edited the favorites
+    def watch(self, callback):
+        self.on_reload = callback
+        if self.watch_id is None:
+            self.watch_id = GLib.timeout_add_seconds(FAVORITES_WATCH_INTERVAL, self.on_watch)
+            
+    def on_watch(self):
+        self.reload()
+        return True
+                
+    ### one-shot copy of the old config_d, it is left in place as a backup
+    def migrate(self, old):
+        if not old.exists():
+            return
+        for url, name in old.load():
+            self.apply(url, name)
+        try:
+            self.backend.write(self._stations, None)
+            print(f"{len(self.stations)} favorites migrated from {old.path} to {self.backend.path}")
+        except OSError as e:
+            print("favorites not migrated:", e)
+        
+    def __contains__(self, url):
+        return url in self.stations
+        
+    def __len__(self):
+        return len(self.stations)
+        
+    def items(self):
+        return list(self.stations.items())
+        
+    def add(self, name, url):
+        if not url or url in self.stations:
+            return False
+        self.stations[url] = name
+        self.changes.append((url, name))
+        self.schedule_flush()
+        return True
+        
+    def remove(self, url):
+        if self.stations.pop(url, None) is None:
+            return False
+        self.changes.append((url, None))
+        self.schedule_flush()
+        return True
+        
+    def import_playlist(self, entries):
+        return [(name, url) for name, url in entries if self.add(name, url)]
+        
+    def export_playlist(self, path):
+        stations = ((name, url) for url, name in self.stations.items())
+        write_atomic(path, playlist_lines(stations, pls=path.lower().endswith(".pls")))
+        
+    def schedule_flush(self):
+        if self.flush_id is None:
+            self.flush_id = GLib.timeout_add(FAVORITES_FLUSH_DELAY, self.flush)
+            
+    def flush(self):
+        self.flush_id = None
+        try:
+            with self.backend.locked():
+                ### a compaction rewrites the whole list, it has to include the other process' lines
+                self.reload()
+                changes, self.changes = self.changes, []
+                self.backend.write(self._stations, changes)
+        except OSError as e:
+            print("favorites not saved:", e)
+        return False
+        
+    def close(self):
+        if self.watch_id is not None:
+            GLib.source_remove(self.watch_id)
+            self.watch_id = None
+        if self.flush_id is not None:
+            GLib.source_remove(self.flush_id)
+            self.flush()
+        
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### every icon is decoded and scaled once, rows share the pixbuf
+
+from gi.repository import GdkPixbuf
+
+ICONS = {}
+
+### Gtk4 front ends, icon.png and icon_fav.png next to the scripts
+def load_icon(filename, size=20):
+    key = (filename, size)
+    icon = ICONS.get(key)
+    if icon is None:
+        icon = GdkPixbuf.Pixbuf.new_from_file(filename).scale_simple(size, size, GdkPixbuf.InterpType.NEAREST)
+        ICONS[key] = icon
+    return icon
+    
+### Gtk3 front ends, named icons of the theme, Gtk is the version the script required
+def load_theme_icon(name, size=16):
+    from gi.repository import Gtk
+    key = ("theme", name, size)
+    icon = ICONS.get(key)
+    if icon is None:
+        icon = Gtk.IconTheme.get_default().load_icon(name, size, Gtk.IconLookupFlags.USE_BUILTIN)
+        ICONS[key] = icon
+    return icon
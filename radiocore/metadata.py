@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### now playing titles with time and station, a bounded ring kept in memory and on disk
+
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from radiocore.files import write_atomic
+
+HISTORY_FILE = "history.jsonl" # None keeps the history in memory only
+HISTORY_SIZE = 2000 # titles
+
+TAG_FIELDS = {
+    "title": "title",
+    "artist": "artist",
+    "organization": "organization",
+    "bitrate": "bitrate",
+    "nominal-bitrate": "bitrate",
+    "audio-codec": "codec",
+}
+
+def read_tags(taglist):
+    ### one pass over the taglist, only the fields shown or recorded are read
+    tags = {}
+    if taglist is None:
+        return tags
+    for i in range(taglist.n_tags()):
+        name = taglist.nth_tag_name(i)
+        field = TAG_FIELDS.get(name)
+        if field is None or field in tags:
+            continue
+        value = taglist.get_value_index(name, 0)
+        if value is not None and value != "" and value != "None":
+            tags[field] = value
+    return tags
+
+class MetadataHistory:
+    def __init__(self, path=HISTORY_FILE, size=HISTORY_SIZE):
+        self.path = path
+        self.size = size
+        self.lines = 0
+        self._entries = None
+        ### one writer thread reads the file, keeps the ring and writes in order, the main loop never waits for the disk
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+        
+    ### the file is read on first use in the writer thread, not while a window starts
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = deque(maxlen=self.size)
+            self.load()
+        return self._entries
+        
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            f = open(self.path, encoding="utf-8")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                self.lines += 1
+                try:
+                    self.entries.append(json.loads(line))
+                except ValueError:
+                    continue
+                    
+    def add(self, station, url, title, tags):
+        entry = {"time": time.time(), "station": station, "url": url, "title": title}
+        for key in ("artist", "organization"):
+            if key in tags:
+                entry[key] = tags[key]
+        self.writer.submit(self.record, entry)
+        
+    def record(self, entry):
+        self.entries.append(entry)
+        if self.path is None:
+            return
+        self.lines += 1
+        if self.lines > 2 * self.size:
+            ### the file is rewritten from the ring once it holds twice as many lines
+            entries = list(self.entries)
+            self.lines = len(entries)
+            self.rewrite(entries)
+        else:
+            self.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            
+    def append(self, line):
+        try:
+            with open(self.path, 'a', encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            print("history not saved:", e)
+            
+    def rewrite(self, entries):
+        try:
+            write_atomic(self.path, (json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        except OSError as e:
+            print("history not saved:", e)
+            
+    ### a Future of the matching entries, newest first, after the titles added before
+    def query(self, station=None, since=None, until=None, limit=None):
+        return self.writer.submit(self.find, station, since, until, limit)
+        
+    def find(self, station, since, until, limit):
+        found = []
+        for entry in reversed(self.entries):
+            if until is not None and entry["time"] > until:
+                continue
+            if since is not None and entry["time"] < since:
+                break
+            if station is not None and station not in (entry["station"], entry["url"]):
+                continue
+            found.append(entry)
+            if limit is not None and len(found) >= limit:
+                break
+        return found
+        
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### the playbin engine of all front ends, one player plus an optional paused spare for prerolling
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, GObject
+from radiocore.resolver import RESOLVER
+from radiocore.metadata import read_tags
+
+### GStreamer is loaded and scans its plugins with the first play, a window shows without it
+Gst = None
+
+def init_gstreamer():
+    global Gst
+    if Gst is None:
+        from gi.repository import Gst
+    if not Gst.is_initialized():
+        Gst.init(None)
+
+CROSSFADE = 0 # ms, 0 switches at once
+CROSSFADE_STEPS = 10
+
+### playbin buffering, "low-latency" starts and switches fast, "robust" rides out a bad network
+PLAYBACK_PROFILE = "robust"
+PLAYBACK_PROFILES = {
+    "default": {},
+    "low-latency": {"buffer-size": 64 * 1024, # bytes
+                    "buffer-duration": 500 * 1000 * 1000}, # ns
+    "robust": {"buffer-size": 2 * 1024 * 1024,
+               "buffer-duration": 10 * 1000 * 1000 * 1000,
+               "ring-buffer-max-size": 16 * 1024 * 1024},
+}
+RECONNECT_DELAY = 1000 # ms before the first reconnect, doubled on every further attempt
+RECONNECT_MAX_DELAY = 60 * 1000 # ms
+RECONNECT_ATTEMPTS = 10 # in a row, a stream that plays for RECONNECT_STABLE resets the count
+RECONNECT_STABLE = 30 * 1000 # ms, a stream that drops sooner keeps counting and backing off
+TITLE_INTERVAL = 250 # ms, tag messages in this window cause one title-changed
+
+class Player(GObject.Object):
+    __gtype_name__ = 'RadioPlayer'
+    __gsignals__ = {
+        ### the now playing title, coalesced to one per TITLE_INTERVAL
+        "title-changed": (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+        ### buffering, reconnect and error messages, "" once they are over
+        "status": (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+        "state-changed": (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+    }
+
+    def __init__(self, profile=PLAYBACK_PROFILE, preroll=False, history=None):
+        super().__init__()
+        self.profile = profile
+        self.history = history
+        self.volume = 1.0
+        self.muted = False
+        self.prerolling = preroll
+        self.playbin = None
+        self.bus = None
+        self.spare = None
+
+        self.generation = 0
+        self.name = None
+        self.url = None
+        self.stream = None # the resolved stream url that plays
+        self.title = None
+        self.tags = {}
+        self.title_timeout = None
+        self.reconnect_id = None
+        self.reconnect_attempt = 0
+        self.stable_id = None
+        self.buffering = False
+
+        self.preroll_url = None
+        self.preroll_stream = None
+        self.preroll_tags = {} # sent by the spare while it waits, taken over with the swap
+        self.preroll_generation = 0
+        self.fade_id = None
+        self.fade_step = 0
+
+    def ensure_pipeline(self):
+        if self.playbin is not None:
+            return
+        init_gstreamer()
+        self.playbin = self.make_player('player')
+        self.playbin.set_property("volume", self.volume)
+        self.playbin.set_property("mute", self.muted)
+        self.bus = self.playbin.get_bus()
+        if self.prerolling:
+            self.spare = self.make_player('spare')
+
+    def make_player(self, name):
+        playbin = Gst.ElementFactory.make('playbin', name)
+        for key, value in PLAYBACK_PROFILES[self.profile].items():
+            playbin.set_property(key, value)
+
+        ### Listen for metadata, buffering and dropped streams
+        bus = playbin.get_bus()
+        bus.add_signal_watch()
+        bus.connect('message::tag', self.on_tag)
+        bus.connect('message::error', self.on_error)
+        bus.connect('message::eos', self.on_eos)
+        bus.connect('message::buffering', self.on_buffering)
+        bus.connect('message::stream-start', self.on_stream_start)
+        return playbin
+
+    def is_playing(self):
+        return self.url is not None
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.playbin is not None and self.fade_id is None:
+            self.playbin.set_property("volume", volume)
+
+    def get_mute(self):
+        return self.muted
+
+    def set_mute(self, mute):
+        self.muted = mute
+        if self.playbin is not None:
+            self.playbin.set_property("mute", mute)
+
+    def play(self, name, url):
+        ### the playlist is resolved off the main loop, a newer play() wins
+        self.ensure_pipeline()
+        self.generation += 1
+        generation = self.generation
+        self.cancel_reconnect()
+        self.reconnect_attempt = 0
+        self.buffering = False
+        self.url = url
+        self.name = name
+        self.stream = None
+        self.tags = {}
+        self.title = None
+        self.emit("state-changed", True)
+        RESOLVER.request(url, lambda stream: self.start_stream(generation, name, stream))
+
+    def start_stream(self, generation, name, url):
+        if generation != self.generation:
+            return False
+        if not url:
+            if self.reconnect_attempt:
+                self.schedule_reconnect(f"{name}: no stream found")
+            else:
+                self.give_up(f"{name}: no stream found")
+            return False
+        print(f"{name} - {url}")
+        self.stream = url
+        self.finish_fade()
+        if self.spare is not None and url == self.preroll_stream:
+            self.swap_players()
+        else:
+            self.playbin.set_state(Gst.State.NULL)
+            self.playbin.set_property('uri', url)
+            self.playbin.set_property("volume", self.volume)
+            self.playbin.set_state(Gst.State.PLAYING)
+        self.set_mute(False)
+        return False
+
+    def stop(self):
+        self.generation += 1
+        self.url = None
+        self.cancel_reconnect()
+        self.buffering = False
+        self.finish_fade()
+        if self.playbin is not None:
+            self.playbin.set_state(Gst.State.NULL)
+        self.release_preroll()
+        self.emit("state-changed", False)
+
+    def on_error(self, bus, msg):
+        error, debug = msg.parse_error()
+        if bus is not self.bus:
+            ### the prerolled station is broken, it gets played the normal way
+            print("preroll failed:", error.message)
+            self.release_preroll()
+            return
+        print("playback error:", error.message)
+        self.schedule_reconnect(error.message)
+
+    def on_eos(self, bus, msg):
+        ### a radio stream never ends, the server dropped the connection
+        if bus is self.bus:
+            self.schedule_reconnect("stream ended")
+
+    def on_stream_start(self, bus, msg):
+        if bus is self.bus and self.reconnect_attempt:
+            self.cancel_stable()
+            self.stable_id = GLib.timeout_add(RECONNECT_STABLE, self.on_stable)
+
+    def on_stable(self):
+        self.stable_id = None
+        self.reconnect_attempt = 0
+        return False
+
+    def cancel_stable(self):
+        if self.stable_id is not None:
+            GLib.source_remove(self.stable_id)
+            self.stable_id = None
+
+    def on_buffering(self, bus, msg):
+        ### paused while the buffer fills, so playback does not stutter
+        if bus is not self.bus or self.url is None:
+            return
+        percent = msg.parse_buffering()
+        if percent < 100:
+            if not self.buffering:
+                self.buffering = True
+                self.playbin.set_state(Gst.State.PAUSED)
+            self.emit("status", f"buffering {percent}%")
+        elif self.buffering:
+            self.buffering = False
+            self.playbin.set_state(Gst.State.PLAYING)
+            self.emit("status", "")
+
+    def schedule_reconnect(self, reason):
+        if self.url is None or self.reconnect_id is not None:
+            return
+        self.cancel_stable()
+        self.playbin.set_state(Gst.State.NULL)
+        self.buffering = False
+        ### a playlist may list more streams, the next one is tried before backing off
+        stream = RESOLVER.fallback(self.url, self.stream)
+        if stream is not None:
+            self.emit("status", f"{reason}, trying the next stream")
+            self.start_stream(self.generation, self.name, stream)
+            return
+        if self.reconnect_attempt >= RECONNECT_ATTEMPTS:
+            self.give_up(f"{reason}, gave up after {self.reconnect_attempt} attempts")
+            return
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_DELAY * 2 ** self.reconnect_attempt)
+        self.reconnect_attempt += 1
+        self.emit("status", f"{reason}, reconnecting in {delay / 1000:.0f} s")
+        self.reconnect_id = GLib.timeout_add(delay, self.reconnect)
+
+    def give_up(self, message):
+        ### the message stays on the label, the front ends show the player as stopped
+        self.stop()
+        self.emit("status", message)
+        
+    def cancel_reconnect(self):
+        self.cancel_stable()
+        if self.reconnect_id is not None:
+            GLib.source_remove(self.reconnect_id)
+            self.reconnect_id = None
+
+    def reconnect(self):
+        self.reconnect_id = None
+        if self.url is None:
+            return False
+        ### a playlist may point to another server by now
+        RESOLVER.invalidate(self.url)
+        attempt = self.reconnect_attempt
+        self.play(self.name, self.url)
+        self.reconnect_attempt = attempt
+        return False
+
+    def preroll(self, url):
+        if not self.prerolling or not url or url in (self.preroll_url, self.url):
+            return
+        self.ensure_pipeline()
+        self.finish_fade()
+        self.preroll_url = url
+        self.preroll_generation += 1
+        generation = self.preroll_generation
+        RESOLVER.request(url, lambda stream: self.start_preroll(generation, stream))
+
+    def start_preroll(self, generation, stream):
+        if generation != self.preroll_generation or not stream:
+            return False
+        ### the station started playing while its playlist resolved, a second connection would only waste bandwidth
+        if stream == self.stream or (self.preroll_url == self.url and self.stream is not None):
+            self.release_preroll()
+            return False
+        ### paused, the stream connects and the decoders are set up without sound
+        self.spare.set_state(Gst.State.NULL)
+        self.preroll_tags = {}
+        self.spare.set_property('uri', stream)
+        self.spare.set_property("volume", self.volume)
+        self.spare.set_state(Gst.State.PAUSED)
+        self.preroll_stream = stream
+        return False
+
+    def release_preroll(self):
+        self.preroll_generation += 1
+        self.preroll_url = None
+        self.preroll_stream = None
+        self.preroll_tags = {}
+        if self.spare is not None:
+            self.spare.set_state(Gst.State.NULL)
+
+    def swap_players(self):
+        old = self.playbin
+        self.playbin, self.spare = self.spare, old
+        self.bus = self.playbin.get_bus()
+        self.preroll_generation += 1
+        self.preroll_url = None
+        self.preroll_stream = None
+        tags, self.preroll_tags = self.preroll_tags, {}
+        if tags:
+            self.update_tags(tags)
+        if CROSSFADE > 0 and old.get_state(0)[1] == Gst.State.PLAYING:
+            self.playbin.set_property("volume", 0.0)
+            self.playbin.set_state(Gst.State.PLAYING)
+            self.fade_step = 0
+            self.fade_id = GLib.timeout_add(max(1, CROSSFADE // CROSSFADE_STEPS), self.fade, old)
+        else:
+            old.set_state(Gst.State.NULL)
+            self.playbin.set_property("volume", self.volume)
+            self.playbin.set_state(Gst.State.PLAYING)
+
+    def fade(self, old):
+        self.fade_step += 1
+        level = self.fade_step / CROSSFADE_STEPS
+        self.playbin.set_property("volume", self.volume * level)
+        old.set_property("volume", self.volume * (1 - level))
+        if self.fade_step < CROSSFADE_STEPS:
+            return True
+        self.fade_id = None
+        old.set_state(Gst.State.NULL)
+        return False
+
+    def finish_fade(self):
+        if self.fade_id is None:
+            return
+        GLib.source_remove(self.fade_id)
+        self.fade_id = None
+        self.spare.set_state(Gst.State.NULL)
+        self.playbin.set_property("volume", self.volume)
+
+    def on_tag(self, bus, msg):
+        tags = read_tags(msg.parse_tag())
+        if bus is not self.bus:
+            ### title, organization and bitrate come once at connect, the spare gets them while it waits
+            self.preroll_tags.update(tags)
+            return
+        self.update_tags(tags)
+        
+    def update_tags(self, tags):
+        ### most tag messages repeat what the stream sent before
+        if all(self.tags.get(key) == value for key, value in tags.items()):
+            return
+        self.tags.update(tags)
+        title = self.tags.get("title", "")
+        artist = self.tags.get("artist")
+        if artist and title and not artist in title:
+            title = f"{artist} - {title}"
+        if title and title != self.title:
+            print(title)
+            self.title = title
+            if self.history is not None:
+                self.history.add(self.name, self.url, title, self.tags)
+        if self.title_timeout is None:
+            self.title_timeout = GLib.timeout_add(TITLE_INTERVAL, self.emit_title)
+
+    def emit_title(self):
+        self.title_timeout = None
+        self.emit("title-changed", self.title or "")
+        return False
+
+    def info(self):
+        ### organization, codec and bitrate of the current stream as far as it told
+        info = []
+        if "organization" in self.tags:
+            info.append(str(self.tags["organization"]))
+        if "codec" in self.tags:
+            info.append(str(self.tags["codec"]))
+        if "bitrate" in self.tags:
+            info.append(f"{self.tags['bitrate'] // 1000} kbit/s")
+        return info
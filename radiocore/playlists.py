@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### stream playlists (pls, m3u, m3u8, xspf, asx) resolved to the stream urls they list
+
+import re
+import html
+from urllib.parse import urljoin, urlsplit
+
+PLAYLIST_MAX_BYTES = 64 * 1024 # playlists are small, a stream is never read past this
+PLAYLIST_CHUNK_SIZE = 8 * 1024
+PLAYLIST_MAX_DEPTH = 3 # playlists pointing to playlists
+PLAYLIST_SUFFIXES = (".pls", ".m3u", ".m3u8", ".xspf", ".asx", ".wax", ".wvx")
+
+CONTENT_TYPES = {
+    "audio/x-scpls": "pls",
+    "audio/scpls": "pls",
+    "audio/mpegurl": "m3u",
+    "audio/x-mpegurl": "m3u",
+    "application/mpegurl": "m3u",
+    "application/x-mpegurl": "m3u",
+    "application/vnd.apple.mpegurl": "m3u",
+    "application/xspf+xml": "xspf",
+    "video/x-ms-asx": "asx",
+    "video/x-ms-asf": "asx",
+    "video/x-ms-wvx": "asx",
+    "audio/x-ms-wax": "asx",
+}
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
+            }
+
+URL_LINE = re.compile(r"^(https?|mms|mmsh|rtsp|rtmp|icyx?)://", re.I)
+XSPF_LOCATION = re.compile(r"<location>\s*(.*?)\s*</location>", re.I | re.S)
+ASX_REF = re.compile(r"<ref\s+href\s*=\s*[\"']([^\"']+)[\"']", re.I)
+
+def is_playlist(url):
+    return urlsplit(url).path.lower().endswith(PLAYLIST_SUFFIXES)
+
+def sniff(text):
+    head = text.lstrip("\ufeff \t\r\n")[:1024]
+    lower = head.lower()
+    if lower.startswith("[playlist]") or lower.startswith("[reference]"):
+        return "pls"
+    if "<asx" in lower:
+        return "asx"
+    if "<playlist" in lower and "xspf" in lower:
+        return "xspf"
+    if lower.startswith("#extm3u") or URL_LINE.match(head):
+        return "m3u"
+    return None
+
+### File1=, File2= ... in their own order, [Reference] files use Ref1=
+def parse_pls(text, base):
+    entries = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition("=")
+        key = key.strip().lower()
+        value = value.strip()
+        if not sep or not value:
+            continue
+        for prefix in ("file", "ref"):
+            if key.startswith(prefix):
+                number = key[len(prefix):]
+                entries.setdefault(int(number) if number.isdigit() else 0, urljoin(base, value))
+                break
+    return [entries[number] for number in sorted(entries)]
+
+def parse_m3u(text, base):
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-"):
+            ### hls master or media playlist, gstreamer plays it from the playlist url
+            return [base]
+        if line and not line.startswith("#"):
+            urls.append(urljoin(base, line))
+    return urls
+
+def parse_xspf(text, base):
+    return [urljoin(base, html.unescape(url)) for url in XSPF_LOCATION.findall(text)]
+
+def parse_asx(text, base):
+    return [urljoin(base, html.unescape(url)) for url in ASX_REF.findall(text)]
+
+PARSERS = {"pls": parse_pls, "m3u": parse_m3u, "xspf": parse_xspf, "asx": parse_asx}
+
+def read_head(response, limit=PLAYLIST_MAX_BYTES):
+    data = bytearray()
+    for chunk in response.iter_content(PLAYLIST_CHUNK_SIZE):
+        data += chunk
+        if len(data) >= limit:
+            ### the last line may be cut in half
+            return bytes(data[:limit].rpartition(b"\n")[0]), True
+    return bytes(data), False
+
+### every stream url of a playlist in fallback order, get is a requests style get()
+def stream_urls(url, get, depth=PLAYLIST_MAX_DEPTH):
+    response = get(url, headers=HEADERS, stream=True)
+    try:
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "").partition(";")[0].strip().lower()
+        kind = CONTENT_TYPES.get(content_type)
+        if kind is None and content_type.startswith("audio/"):
+            ### a stream behind a playlist-looking url
+            return [url]
+        data, truncated = read_head(response)
+        base = response.url or url
+        text = data.decode(response.encoding or "utf-8", errors="replace")
+    finally:
+        response.close()
+    sniffed = sniff(text)
+    if sniffed is None and (kind is None or kind == "asx"):
+        ### binary asf or an unknown type, hand it to gstreamer as it is
+        if truncated or (content_type and not content_type.startswith("text/")):
+            return [url]
+        return []
+    urls = []
+    for entry in PARSERS[sniffed or kind](text, base):
+        if depth > 0 and entry != base and is_playlist(entry):
+            try:
+                entries = stream_urls(entry, get, depth - 1)
+            except OSError as e:
+                print("playlist not readable:", entry, e)
+                continue
+        else:
+            entries = [entry]
+        for stream in entries:
+            if not stream in urls:
+                urls.append(stream)
+    return urls
+
+def resolve(url, get):
+    print("playlist detecting", url)
+    urls = stream_urls(url, get)
+    if not urls:
+        print("no urls found")
+    else:
+        print(urls[0] if len(urls) == 1 else f"{urls[0]} and {len(urls) - 1} more")
+    return urls
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### stream urls are checked in the background, dead stations are greyed out
+
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from gi.repository import GLib
+import requests
+from radiocore import playlists
+from radiocore.client import CLIENT
+from radiocore.files import write_atomic
+from radiocore.resolver import RESOLVER
+
+PROBE_WORKERS = 8
+PROBE_TIMEOUT_STREAM = (3, 4) # connect, read
+PROBE_TTL = 6 * 60 * 60 # seconds a verdict is trusted
+PROBE_CACHE_FILE = "probe_cache.json" # None keeps the verdicts in memory only
+PROBE_CACHE_SIZE = 20000 # verdicts
+
+STREAM_UNKNOWN = 0
+STREAM_ALIVE = 1
+STREAM_DEAD = 2
+
+class StreamProber:
+    def __init__(self, path=PROBE_CACHE_FILE, ttl=PROBE_TTL, size=PROBE_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        self.pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="probe")
+        self.verdicts = OrderedDict() # url -> (time, state, info)
+        self.pending = {}
+        self.wanted = set()
+        self.load()
+        
+    def verdict(self, url):
+        entry = self.verdicts.get(url)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1], entry[2]
+        
+    def set_wanted(self, urls):
+        ### probes of an earlier search are skipped by the workers
+        self.wanted = set(urls)
+        
+    def want(self, urls):
+        self.wanted = self.wanted | set(urls)
+        
+    def request(self, url, callback):
+        ### callback(url, state, info) runs on the main loop, one probe per url
+        if url in self.pending:
+            self.pending[url].append(callback)
+            return
+        self.pending[url] = [callback]
+        self.submit(url)
+        
+    def submit(self, url):
+        future = self.pool.submit(self.probe, url)
+        future.add_done_callback(lambda future: GLib.idle_add(self.on_probed, url, future))
+        
+    def probe(self, url):
+        ### runs in a worker, only the response headers are read, None means skipped
+        if url not in self.wanted:
+            return None
+        stream = url
+        if playlists.is_playlist(url):
+            stream = RESOLVER.wait(url)
+            if not stream:
+                return STREAM_DEAD, "playlist without streams"
+        try:
+            resp = CLIENT.get(stream, headers={"Icy-MetaData": "1"}, stream=True, timeout=PROBE_TIMEOUT_STREAM)
+        except requests.ConnectionError as e:
+            if "ICY 200" in str(e):
+                ### shoutcast v1 answers without an http status line
+                return STREAM_ALIVE, "shoutcast"
+            return STREAM_DEAD, "not reachable"
+        except requests.Timeout:
+            return STREAM_DEAD, "no answer"
+        except requests.RequestException:
+            return STREAM_UNKNOWN, ""
+        with resp:
+            if resp.status_code >= 400:
+                return STREAM_DEAD, f"HTTP {resp.status_code}"
+            content_type = resp.headers.get("content-type", "").partition(";")[0].strip().lower()
+            if content_type.startswith("text/html"):
+                return STREAM_DEAD, "no audio stream"
+            info = [f"{resp.headers['icy-br'].partition(',')[0]} kbit/s"] if resp.headers.get("icy-br") else []
+            if content_type:
+                info.append(content_type)
+            return STREAM_ALIVE, " ".join(info)
+            
+    def on_probed(self, url, future):
+        callbacks = self.pending.pop(url, [])
+        try:
+            result = future.result()
+        except Exception as e:
+            print("probe failed:", url, e)
+            result = STREAM_UNKNOWN, ""
+        if result is None:
+            if callbacks and url in self.wanted:
+                ### skipped while not wanted, a newer search asked for it again meanwhile
+                self.pending[url] = callbacks
+                self.submit(url)
+            return False
+        state, info = result
+        if state != STREAM_UNKNOWN:
+            self.verdicts[url] = (time.time(), state, info)
+            self.verdicts.move_to_end(url)
+            while len(self.verdicts) > self.size:
+                self.verdicts.popitem(last=False)
+        ### every waiting row gets an answer, also without a verdict, so it can ask again later
+        for callback in callbacks:
+            callback(url, state, info)
+        return False
+        
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for url, stamp, state, info in entries[-self.size:]:
+            if now - stamp < self.ttl:
+                self.verdicts[url] = (stamp, state, info)
+                
+    def save(self):
+        if self.path is None:
+            return
+        entries = [[url, stamp, state, info] for url, (stamp, state, info) in self.verdicts.items()]
+        write_atomic(self.path, json.dumps(entries))
+        
+PROBER = StreamProber()
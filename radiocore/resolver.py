@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### playlist urls (.pls / .m3u ...) point to the stream, it is fetched once and cached
+### with all its entries, the player falls back to the next one when a stream fails
+
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from gi.repository import GLib
+from radiocore import playlists
+
+def resolve_stream(url):
+    if playlists.is_playlist(url):
+        ### requests is only loaded once a playlist has to be fetched
+        from radiocore.client import CLIENT
+        return playlists.resolve(url, CLIENT.get)
+    return [url]
+    
+RESOLVE_TTL = 30 * 60 # seconds a resolved stream url is reused
+RESOLVE_WORKERS = 2
+PRERESOLVE_WORKERS = 2
+
+class StreamResolver:
+    def __init__(self, resolve=resolve_stream, ttl=RESOLVE_TTL):
+        self.resolve = resolve
+        self.ttl = ttl
+        self.cache = {} # playlist url -> (time, stream urls in fallback order)
+        self.pending = {} # playlist url -> Future
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=RESOLVE_WORKERS, thread_name_prefix="resolve")
+        self.background = ThreadPoolExecutor(max_workers=PRERESOLVE_WORKERS, thread_name_prefix="preresolve")
+        
+    def cached(self, url):
+        if not playlists.is_playlist(url):
+            return url
+        with self.lock:
+            entry = self.cache.get(url)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1][0]
+        return None
+        
+    def fallback(self, url, stream):
+        ### the playlist entry after stream, None once every entry was tried
+        with self.lock:
+            entry = self.cache.get(url)
+        if entry is None or stream not in entry[1]:
+            return None
+        streams = entry[1]
+        index = streams.index(stream) + 1
+        return streams[index] if index < len(streams) else None
+        
+    def submit(self, url, pool):
+        with self.lock:
+            future = self.pending.get(url)
+            ### a click overtakes a prefetch that is still queued
+            if future is not None and pool is self.pool and future.cancel():
+                future = None
+            if future is None:
+                future = pool.submit(self.load, url)
+                self.pending[url] = future
+        return future
+        
+    def load(self, url):
+        try:
+            streams = self.resolve(url)
+        except (OSError, ValueError) as e:
+            ### requests errors are OSErrors
+            print("playlist not resolved:", url, e)
+            streams = []
+        with self.lock:
+            self.pending.pop(url, None)
+            if streams:
+                self.cache[url] = (time.time(), streams)
+        return streams[0] if streams else None
+        
+    ### callback(stream url or None) runs in the main loop
+    def request(self, url, callback):
+        stream = self.cached(url)
+        if stream:
+            callback(stream)
+            return
+        future = self.submit(url, self.pool)
+        future.add_done_callback(lambda f: GLib.idle_add(callback, None if f.cancelled() or f.exception() else f.result()))
+        
+    ### blocks, for worker threads, a fetch that is already running is shared
+    def wait(self, url):
+        stream = self.cached(url)
+        if stream:
+            return stream
+        while True:
+            try:
+                return self.submit(url, self.background).result()
+            except CancelledError:
+                ### a click took the queued fetch over, wait for that one
+                continue
+                
+    def prefetch(self, urls):
+        for url in urls:
+            if playlists.is_playlist(url) and self.cached(url) is None:
+                self.submit(url, self.background)
+                
+    def invalidate(self, url):
+        with self.lock:
+            self.cache.pop(url, None)
+        
+RESOLVER = StreamResolver()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### one search at a time in a worker pool, the answer of a replaced search is dropped
+
+from gi.repository import GLib
+
+class SearchRunner:
+    def __init__(self, pool):
+        self.pool = pool
+        self.future = None
+        self.generation = 0
+        self.text = None
+
+    ### on_done(result) or on_failed(error) runs on the main loop, only for the newest search
+    def start(self, text, function, on_done, on_failed, *args, **kwargs):
+        self.cancel()
+        generation = self.generation
+        self.text = text
+        self.future = self.pool.submit(function, *args, **kwargs)
+        self.future.add_done_callback(
+            lambda future: GLib.idle_add(self.finish, future, generation, on_done, on_failed))
+
+    def cancel(self):
+        self.generation += 1
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    ### search-changed is delayed, it may follow the Enter that started a search for this text
+    def changed(self, text):
+        if text != self.text:
+            self.cancel()
+
+    def finish(self, future, generation, on_done, on_failed):
+        if generation != self.generation or future.cancelled():
+            return False
+        self.future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            print("search failed:", e)
+            on_failed(e)
+            return False
+        on_done(result)
+        return False
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### startup measurement, with RADIO_STARTUP_BENCHMARK set a window reports its first painted
+### frame on stdout and quits, benchmarks/startup.py times that from the outside
+
+import importlib
+import os
+from gi.repository import GLib
+
+BENCHMARK_ENV = "RADIO_STARTUP_BENCHMARK"
+FIRST_FRAME = "first-frame"
+
+def benchmarking():
+    return bool(os.environ.get(BENCHMARK_ENV))
+
+def report_first_frame(window, quit):
+    if not benchmarking():
+        return
+    def on_paint(clock):
+        clock.disconnect(handler[0])
+        print(FIRST_FRAME, flush=True)
+        ### the deferred startup work still runs, it must not delay the frame it follows
+        GLib.idle_add(quit)
+    def on_map(widget):
+        clock = widget.get_frame_clock()
+        handler.append(clock.connect("after-paint", on_paint))
+    handler = []
+    window.connect("map", on_map)
+
+### the window is shown first, the rest of the startup runs when the main loop is idle
+def after_first_frame(callback, *args):
+    GLib.idle_add(callback, *args, priority=GLib.PRIORITY_LOW)
+
+### modules the first search needs are imported in a worker once the window is up
+def preload(pool, *modules):
+    def submit():
+        for module in modules:
+            pool.submit(importlib.import_module, module)
+        return False
+    after_first_frame(submit)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### offline mirror of the whole radio-browser station list with a full text index
+
+import os
+import sqlite3
+import threading
+import time
+import requests
+from radiocore.browser import RadioBrowser
+
+STATION_DB = "stations.db"
+STATION_DB_REFRESH = 24 * 60 * 60 # seconds between two incremental updates
+STATION_DB_LIMIT = 500 # results of a local search
+TRIGRAM_MIN = 3 # characters, shorter search text scans the table instead of the index
+TRIGRAM_SQLITE = (3, 34, 0) # first SQLite with the fts5 trigram tokenizer
+
+STATION_COLUMNS = ("stationuuid", "changeuuid", "lastchangetime", "name", "url", "url_resolved",
+                   "homepage", "favicon", "tags", "countrycode", "codec", "bitrate", "clickcount")
+
+STATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stations (
+    stationuuid TEXT PRIMARY KEY, changeuuid TEXT, lastchangetime TEXT,
+    name TEXT, url TEXT, url_resolved TEXT, homepage TEXT, favicon TEXT,
+    tags TEXT, countrycode TEXT, codec TEXT, bitrate INTEGER, clickcount INTEGER
+);
+CREATE INDEX IF NOT EXISTS stations_countrycode ON stations (countrycode);
+CREATE VIRTUAL TABLE IF NOT EXISTS stations_fts USING fts5(
+    name, tags, content='stations', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS stations_ai AFTER INSERT ON stations BEGIN
+    INSERT INTO stations_fts (rowid, name, tags) VALUES (new.rowid, new.name, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS stations_ad AFTER DELETE ON stations BEGIN
+    INSERT INTO stations_fts (stations_fts, rowid, name, tags) VALUES ('delete', old.rowid, old.name, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS stations_au AFTER UPDATE ON stations BEGIN
+    INSERT INTO stations_fts (stations_fts, rowid, name, tags) VALUES ('delete', old.rowid, old.name, old.tags);
+    INSERT INTO stations_fts (rowid, name, tags) VALUES (new.rowid, new.name, new.tags);
+END;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+### an older SQLite, or one built without fts5, cannot create the index
+def check_trigram():
+    if sqlite3.sqlite_version_info < TRIGRAM_SQLITE:
+        return False
+    try:
+        db = sqlite3.connect(":memory:")
+        try:
+            db.execute("CREATE VIRTUAL TABLE probe USING fts5(name, tokenize='trigram')")
+        finally:
+            db.close()
+    except sqlite3.Error:
+        return False
+    return True
+
+class StationDatabase:
+    def __init__(self, path=STATION_DB):
+        self.path = path
+        self.db = None
+        self.sync_thread = None
+        self.trigram = None # checked on first use
+        
+    def supported(self):
+        if self.trigram is None:
+            self.trigram = check_trigram()
+        return self.trigram
+        
+    def connect(self):
+        if not self.supported():
+            raise sqlite3.NotSupportedError(f"the station database needs SQLite {'.'.join(map(str, TRIGRAM_SQLITE))} "
+                                            f"with fts5, this is {sqlite3.sqlite_version}")
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        rebuild = self.drop_word_index(db)
+        db.executescript(STATION_SCHEMA)
+        if rebuild:
+            with db:
+                db.execute("INSERT INTO stations_fts (stations_fts) VALUES ('rebuild')")
+        return db
+        
+    @staticmethod
+    def drop_word_index(db):
+        ### older databases index whole words, the online search matches substrings
+        row = db.execute("SELECT sql FROM sqlite_master WHERE name = 'stations_fts'").fetchone()
+        if row is None or "trigram" in row[0]:
+            return False
+        with db:
+            db.execute("DROP TABLE stations_fts")
+        return True
+        
+    def reader(self):
+        ### opened on first use, so the file only exists once the mode is used
+        if self.db is None:
+            self.db = self.connect()
+        return self.db
+        
+    def exists(self):
+        return os.path.exists(self.path)
+        
+    ### 0 for a database that cannot be used, the caller searches online instead
+    def count(self):
+        if not self.exists() or not self.supported():
+            return 0
+        try:
+            return self.reader().execute("SELECT count(*) FROM stations").fetchone()[0]
+        except sqlite3.Error as e:
+            print("station database not readable:", e)
+            return 0
+        
+    @staticmethod
+    def get_meta(db, key, default=None):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+        
+    @staticmethod
+    def set_meta(db, key, value):
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+        
+    @staticmethod
+    def match_query(text):
+        ### the text as a substring of the name like the online search, quoted so FTS syntax is harmless
+        return 'name : "{}"'.format(text.replace('"', '""'))
+        
+    @staticmethod
+    def like_pattern(text):
+        return "%{}%".format(text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+        
+    def search(self, params, limit=STATION_DB_LIMIT):
+        limit = int(params.get("limit", limit))
+        offset = int(params.get("offset", 0))
+        name = str(params.get("name", "")).strip()
+        countrycode = str(params.get("countrycode", "")).strip().upper()
+        where = []
+        args = []
+        if name:
+            if str(params.get("nameExact", "false")).lower() == "true":
+                where.append("name = ? COLLATE NOCASE")
+                args.append(name)
+            elif len(name) >= TRIGRAM_MIN:
+                where.append("rowid IN (SELECT rowid FROM stations_fts WHERE stations_fts MATCH ?)")
+                args.append(self.match_query(name))
+            else:
+                where.append("name LIKE ? ESCAPE '\\'")
+                args.append(self.like_pattern(name))
+        if countrycode:
+            where.append("countrycode = ?")
+            args.append(countrycode)
+        sql = "SELECT * FROM stations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY clickcount DESC LIMIT ? OFFSET ?"
+        args += [limit, offset]
+        return [dict(row) for row in self.reader().execute(sql, args)]
+        
+    def store(self, db, stations):
+        placeholders = ", ".join("?" for column in STATION_COLUMNS)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in STATION_COLUMNS[1:])
+        sql = (f"INSERT INTO stations ({', '.join(STATION_COLUMNS)}) VALUES ({placeholders}) "
+               f"ON CONFLICT (stationuuid) DO UPDATE SET {updates}")
+        with db:
+            db.executemany(sql, ([station.get(column) for column in STATION_COLUMNS] for station in stations))
+            
+    def sync(self):
+        ### full download the first time, only the changed stations afterwards
+        db = self.connect()
+        try:
+            rb = RadioBrowser()
+            last_change = self.get_meta(db, "lastchangeuuid")
+            if last_change is None:
+                stations = rb.stations(hidebroken="true")
+            else:
+                stations = rb.stations_changed(lastchangeuuid=last_change)
+            self.store(db, stations)
+            if stations:
+                newest = max(stations, key=lambda station: station.get("lastchangetime") or "")
+                last_change = newest.get("changeuuid") or last_change
+            with db:
+                if last_change:
+                    self.set_meta(db, "lastchangeuuid", last_change)
+                self.set_meta(db, "synced", time.time())
+            print(f"station database: {len(stations)} stations updated")
+        finally:
+            db.close()
+            
+    def needs_sync(self):
+        if not self.supported():
+            return False
+        if not self.exists():
+            return True
+        try:
+            synced = float(self.get_meta(self.reader(), "synced", 0))
+        except sqlite3.Error as e:
+            print("station database not readable:", e)
+            return False
+        return time.time() - synced > STATION_DB_REFRESH
+        
+    def sync_in_background(self, callback=None):
+        if self.sync_thread is not None and self.sync_thread.is_alive():
+            return
+        def run():
+            error = None
+            try:
+                self.sync()
+            except (requests.RequestException, sqlite3.Error) as e:
+                print("station database update failed:", e)
+                error = e
+            if callback is not None:
+                callback(error)
+        self.sync_thread = threading.Thread(target=run, daemon=True)
+        self.sync_thread.start()
+        
+STATIONS = StationDatabase()
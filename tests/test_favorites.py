@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+### python3 -m unittest discover tests
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from radiocore import favorites as module
+from radiocore.favorites import FavoritesStore, JournalFavorites
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "favorites.jsonl")
+        ### an existing log, nothing is migrated from config_d
+        open(self.path, 'w').close()
+        
+    def tearDown(self):
+        self.directory.cleanup()
+        
+    def store(self):
+        return FavoritesStore(JournalFavorites(self.path))
+        
+class TornJournalTest(JournalTest):
+    def test_append_after_torn_line(self):
+        favorites = self.store()
+        favorites.add("A", "http://a")
+        favorites.add("B", "http://b")
+        favorites.close()
+        ### a crash in the middle of the next append
+        with open(self.path, 'a', encoding="utf-8") as f:
+            f.write('{"name": "C", "url": "ht')
+        favorites = self.store()
+        self.assertEqual(favorites.items(), [("http://a", "A"), ("http://b", "B")])
+        favorites.add("D", "http://d")
+        favorites.close()
+        self.assertEqual(self.store().items(), [("http://a", "A"), ("http://b", "B"), ("http://d", "D")])
+        
+    def test_complete_line_without_newline(self):
+        with open(self.path, 'w', encoding="utf-8") as f:
+            f.write('{"name": "A", "url": "http://a"}')
+        favorites = self.store()
+        favorites.add("B", "http://b")
+        favorites.close()
+        self.assertEqual(self.store().items(), [("http://a", "A"), ("http://b", "B")])
+        
+### the window and the daemon write the same log
+class SharedJournalTest(JournalTest):
+    def test_other_process_edits_are_seen(self):
+        window, daemon = self.store(), self.store()
+        window.add("A", "http://a")
+        window.close()
+        self.assertEqual(daemon.items(), [("http://a", "A")])
+        daemon.add("B", "http://b")
+        daemon.close()
+        self.assertEqual(window.items(), [("http://a", "A"), ("http://b", "B")])
+        
+    def test_compaction_keeps_other_process_lines(self):
+        window, daemon = self.store(), self.store()
+        window.add("A", "http://a")
+        window.close()
+        daemon.add("B", "http://b")
+        ### the window rewrites the log before it looked at the daemon's line
+        window.changes.append(("http://c", "C"))
+        window.stations["http://c"] = "C"
+        daemon.close()
+        with mock.patch.object(module, "FAVORITES_COMPACT_SLACK", -1):
+            window.flush()
+        self.assertEqual(window.backend.lines, 3)
+        self.assertEqual(self.store().items(), [("http://a", "A"), ("http://b", "B"), ("http://c", "C")])
+        
+if __name__ == '__main__':
+    unittest.main()